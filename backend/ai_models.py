@@ -18,41 +18,74 @@ class GeminiModel:
     def __init__(self, api_key: str = None):
         self.api_key = api_key or os.getenv('GEMINI_API_KEY')
         self.model_name = "gemini-1.5-flash"
+        self._model = None
     
     def is_available(self) -> bool:
         """Check if Gemini API is available"""
         return bool(self.api_key)
     
+    def _get_model(self):
+        """Get the Gemini model, configuring the client once so its connections are reused across calls"""
+        if self._model is None:
+            import google.generativeai as genai
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.model_name)
+        return self._model
+    
     def generate_quiz_questions(self, subject: str, difficulty: str, num_questions: int, topic: str = None) -> List[Dict[str, Any]]:
         """Generate quiz questions using Google Gemini AI"""
-        if not self.is_available():
-            print("❌ Gemini API key not found. Please set GEMINI_API_KEY environment variable.")
+        request = self._prepare_request(subject, difficulty, num_questions, topic)
+        if request is None:
             return []
         
+        model, prompt = request
         try:
-            print(f"🤖 Using Google Gemini AI for {subject} quiz generation...")
-            
-            # Try to import and use Gemini
-            try:
-                import google.generativeai as genai
-                genai.configure(api_key=self.api_key)
-                model = genai.GenerativeModel(self.model_name)
-            except ImportError:
-                print("❌ Google Generative AI library not installed. Install with: pip install google-generativeai")
-                return []
-            
-            # Create a comprehensive prompt for quiz generation
-            prompt = self._create_quiz_prompt(subject, difficulty, num_questions, topic)
-            
-            # Generate content using Gemini
             response = model.generate_content(prompt)
-            
+        except Exception as e:
+            print(f"❌ Gemini API error: {str(e)}")
+            return []
+        return self._handle_response(response, num_questions)
+    
+    async def generate_quiz_questions_async(self, subject: str, difficulty: str, num_questions: int, topic: str = None) -> List[Dict[str, Any]]:
+        """Generate quiz questions using Google Gemini AI without blocking the event loop"""
+        request = self._prepare_request(subject, difficulty, num_questions, topic)
+        if request is None:
+            return []
+        
+        model, prompt = request
+        try:
+            response = await model.generate_content_async(prompt)
+        except Exception as e:
+            print(f"❌ Gemini API error: {str(e)}")
+            return []
+        return self._handle_response(response, num_questions)
+    
+    def _prepare_request(self, subject: str, difficulty: str, num_questions: int, topic: str = None):
+        """Return (model, prompt) for a generation call, or None if Gemini can't be used"""
+        if not self.is_available():
+            print("❌ Gemini API key not found. Please set GEMINI_API_KEY environment variable.")
+            return None
+        
+        print(f"🤖 Using Google Gemini AI for {subject} quiz generation...")
+        try:
+            model = self._get_model()
+        except ImportError:
+            print("❌ Google Generative AI library not installed. Install with: pip install google-generativeai")
+            return None
+        except Exception as e:
+            print(f"❌ Gemini API error: {str(e)}")
+            return None
+        
+        # Create a comprehensive prompt for quiz generation
+        return model, self._create_quiz_prompt(subject, difficulty, num_questions, topic)
+    
+    def _handle_response(self, response, num_questions: int) -> List[Dict[str, Any]]:
+        """Parse a Gemini response into questions, treating an empty response as a failure"""
+        try:
             if response and response.text:
                 return self._parse_quiz_response(response.text, num_questions)
-            else:
-                print("❌ Gemini API returned empty response")
-                return []
-                
+            print("❌ Gemini API returned empty response")
+            return []
         except Exception as e:
             print(f"❌ Gemini API error: {str(e)}")
             return []
@@ -165,6 +198,20 @@ class AIQuizGenerator:
         # If Gemini fails, return empty list (no fallback)
         print("❌ Gemini AI not available. No questions generated.")
         return []
+    
+    async def generate_quiz_questions_async(self, subject: str, difficulty: str, num_questions: int, 
+                                            topic: str = None, preferred_model: str = None) -> List[Dict[str, Any]]:
+        """Generate quiz questions using Gemini AI from async request handlers"""
+        
+        if self.gemini.is_available():
+            questions = await self.gemini.generate_quiz_questions_async(
+                subject, difficulty, num_questions, topic
+            )
+            if questions:
+                return questions
+        
+        print("❌ Gemini AI not available. No questions generated.")
+        return []
 
 
 # Create a global instance
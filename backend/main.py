@@ -467,10 +467,14 @@ async def get_quiz_analytics(
 async def get_notifications(
     current_user: User = Depends(get_current_active_user),
     db: Session = Depends(get_db),
-    limit: int = 50
+    limit: int = 50,
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[int] = None
 ):
     """Get notifications for the current user."""
-    notifications = notification_service.get_user_notifications(db, current_user.id, limit)
+    notifications = notification_service.get_user_notifications(
+        db, current_user.id, limit, before_created_at, before_id
+    )
     return notifications
 
 @app.put("/notifications/{notification_id}/read")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, ForeignKey, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -150,5 +150,16 @@ class Notification(Base):
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    # Indexes backing the per-user notification feed and mark_all_notifications_read
+    __table_args__ = (
+        Index("ix_notifications_user_created", "user_id", created_at.desc(), id.desc()),
+        Index(
+            "ix_notifications_unread_by_user",
+            "user_id",
+            postgresql_where=(is_read == False),
+            sqlite_where=(is_read == False)
+        ),
+    )
+    
     # Relationships
     user = relationship("User")
@@ -7,10 +7,11 @@ Tracks performance, errors, and user analytics
 import os
 import json
 import time
+import orjson
 import logging
 import structlog
 from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Union
 from fastapi import Request, Response
 from starlette.middleware.base import BaseHTTPMiddleware
 import redis
@@ -43,7 +44,7 @@ class UserAction:
     """User action tracking"""
     user_id: int
     action: str
-    timestamp: datetime
+    timestamp: Union[datetime, int]  # datetime, or ns since epoch from time.time_ns()
     details: Dict[str, Any]
     ip_address: str
     user_agent: str
@@ -169,13 +170,16 @@ class AnalyticsTracker:
     def track_user_action(self, user_action: UserAction):
         """Track user action"""
         try:
+            # Convert once; orjson handles the datetime timestamp natively
+            action_data = asdict(user_action)
+            
             # Log action
-            logger.info("User Action", **asdict(user_action))
+            logger.info("User Action", **action_data)
             
             # Store in Redis for analytics
             if self.redis_client:
                 key = f"user_action:{user_action.user_id}:{datetime.utcnow().strftime('%Y%m%d')}"
-                self.redis_client.lpush(key, json.dumps(asdict(user_action)))
+                self.redis_client.lpush(key, orjson.dumps(action_data))
                 self.redis_client.expire(key, 2592000)  # Keep for 30 days
                 
                 # Update daily stats
@@ -186,7 +190,42 @@ class AnalyticsTracker:
                 
         except Exception as e:
             logger.error("Failed to track user action", error=str(e))
-    
+
+    def track_user_actions_bulk(self, user_actions: List[UserAction]):
+        """Track a batch of user actions with a single Redis round trip"""
+        if not user_actions:
+            return
+
+        try:
+            day = datetime.utcnow().strftime('%Y%m%d')
+            stats_key = f"daily_stats:{day}"
+            pipe = self.redis_client.pipeline(transaction=False) if self.redis_client else None
+            action_counts: Dict[str, int] = {}
+
+            for user_action in user_actions:
+                action_data = asdict(user_action)
+                if isinstance(user_action.timestamp, int):
+                    # Handlers record epoch ns; build the datetime here, off the request path
+                    action_data["timestamp"] = datetime.utcfromtimestamp(user_action.timestamp / 1e9)
+                logger.info("User Action", **action_data)
+                action_counts[user_action.action] = action_counts.get(user_action.action, 0) + 1
+
+                if pipe is not None:
+                    key = f"user_action:{user_action.user_id}:{day}"
+                    pipe.lpush(key, orjson.dumps(action_data))
+                    pipe.expire(key, 2592000)  # Keep for 30 days
+
+            if pipe is not None:
+                # Update daily stats once per action type instead of once per action
+                for action, count in action_counts.items():
+                    pipe.hincrby(stats_key, f"action_{action}", count)
+                pipe.hincrby(stats_key, "total_actions", len(user_actions))
+                pipe.expire(stats_key, 2592000)  # Keep for 30 days
+                pipe.execute()
+
+        except Exception as e:
+            logger.error("Failed to track user actions", error=str(e), count=len(user_actions))
+
     def track_ai_usage(self, user_id: int, model: str, subject: str, num_questions: int, success: bool):
         """Track AI model usage"""
         try:
@@ -1,13 +1,17 @@
 # backend/registration_backend.py
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import json
 import os
 import hashlib
+import itertools
 import secrets
+import time
 from datetime import datetime
+import numpy as np
 from dotenv import load_dotenv
 from ai_models import ai_quiz_generator
 from env_config import DEFAULT_AI_MODEL, print_ai_status
@@ -31,7 +35,7 @@ def verify_password(password: str, hashed_password: str) -> bool:
     except ValueError:
         return False
 
-app = FastAPI(title="Quiz System API", version="1.0.0")
+app = FastAPI(title="Quiz System API", version="1.0.0", default_response_class=ORJSONResponse)
 
 # Add CORS middleware
 app.add_middleware(
@@ -119,6 +123,64 @@ SUPER_ADMIN_PASSWORD = os.getenv('SUPER_ADMIN_PASSWORD', 'Reshun@786')
 schools_db = []
 school_quizzes_db = {}  # school_id -> quizzes
 quiz_results_db = []
+results_by_quiz = {}  # quiz_id -> results, kept in step with quiz_results_db
+quiz_answer_keys = {}  # quiz_id -> (correct answers, points) arrays used for scoring
+
+def build_answer_key(quiz):
+    """Precompute the answer-key arrays used to score submissions for a quiz"""
+    questions = quiz.get("questions") or []
+    answer_key = (
+        np.asarray([q.get("correct_answer") for q in questions], dtype=object),
+        np.asarray([q.get("points", 1) for q in questions], dtype=np.int32)
+    )
+    quiz_answer_keys[quiz["id"]] = answer_key
+    return answer_key
+
+# Timestamp cache for hot paths: (epoch seconds, ISO string)
+_now_iso_cache = (0.0, "")
+
+def now_iso():
+    """Current local time as ISO string, reformatted at most every half second"""
+    global _now_iso_cache
+    t = time.time()
+    if t - _now_iso_cache[0] > 0.5:
+        _now_iso_cache = (t, datetime.fromtimestamp(t).isoformat())
+    return _now_iso_cache[1]
+
+# now_iso() can return the same string for submissions within half a second,
+# so results also carry a monotonic sequence number to break ties on recency
+submission_seq = itertools.count(1)
+
+def result_recency(result):
+    """Sort key ordering quiz results by submission time, newest last"""
+    return (result.get("submitted_at", ""), result.get("submission_seq", 0))
+
+# Analytics cache: (endpoint, owner_id) -> (version, expires_at, payload).
+# owner_id is a teacher id or school id; its version is bumped whenever
+# data feeding that owner's analytics changes.
+ANALYTICS_CACHE_TTL = 30  # seconds
+analytics_cache = {}
+analytics_versions = {}
+
+def invalidate_analytics(*owner_ids):
+    """Mark cached analytics for the given teachers/schools as stale"""
+    for owner_id in owner_ids:
+        if owner_id is not None:
+            analytics_versions[owner_id] = analytics_versions.get(owner_id, 0) + 1
+
+def get_cached_analytics(endpoint, owner_id):
+    """Return a cached analytics payload if it is still current, else None"""
+    cached = analytics_cache.get((endpoint, owner_id))
+    if cached and cached[0] == analytics_versions.get(owner_id, 0) and cached[1] > time.monotonic():
+        return cached[2]
+    return None
+
+def cache_analytics(endpoint, owner_id, payload):
+    """Store an analytics payload for the owner's current data version"""
+    analytics_cache[(endpoint, owner_id)] = (
+        analytics_versions.get(owner_id, 0), time.monotonic() + ANALYTICS_CACHE_TTL, payload
+    )
+    return payload
 
 # Initialize super admin on startup
 def create_super_admin():
@@ -865,6 +927,7 @@ def create_student_account(student_data: StudentCreationRequest):
         }
         
         users_db.append(student)
+        invalidate_analytics(student_data.school_id)
         
         return {
             "message": "Student account created successfully",
@@ -1102,10 +1165,19 @@ def delete_user(admin_id: int, user_id: int):
     
     # Also remove user's quiz results
     quiz_results_db[:] = [r for r in quiz_results_db if r.get("user_id") != user_id]
+    for results in results_by_quiz.values():
+        results[:] = [r for r in results if r.get("user_id") != user_id]
     
     # Remove quizzes created by this user
+    for quiz in quizzes_db:
+        if quiz.get("created_by") == user_id:
+            quiz_answer_keys.pop(quiz["id"], None)
+            results_by_quiz.pop(quiz["id"], None)
     quizzes_db[:] = [q for q in quizzes_db if q.get("created_by") != user_id]
     
+    # Results and users feed every teacher's analytics, so drop the whole cache
+    analytics_cache.clear()
+    
     return {"message": f"User {user_to_delete['name']} has been deleted successfully"}
 
 # AI Model Information
@@ -1231,7 +1303,6 @@ def create_quiz(quiz: QuizCreate):
         raise HTTPException(status_code=403, detail="Invalid user role for quiz creation")
     
     import uuid
-    from datetime import datetime
     
     quiz_id = str(uuid.uuid4())
     
@@ -1249,13 +1320,15 @@ def create_quiz(quiz: QuizCreate):
         "created_by": quiz.user_id,
         "created_by_teacher": teacher_id,  # For students, track their teacher
         "school_id": school_id,  # Associate with school
-        "created_at": datetime.now().isoformat(),
+        "created_at": now_iso(),
         "total_questions": len(quiz.questions),
         "total_points": sum(q.get("points", 1) for q in quiz.questions),
         "questions": quiz.questions,
         "creation_type": "manual"
     }
     quizzes_db.append(new_quiz)
+    build_answer_key(new_quiz)
+    invalidate_analytics(quiz.user_id, school_id)
     return {"message": "Quiz created successfully", "quiz": new_quiz}
 
 @app.post("/api/quizzes/auto-generate")
@@ -1265,7 +1338,6 @@ def auto_generate_quiz(request: QuizGenerationRequest):
         raise HTTPException(status_code=403, detail="Invalid user role for quiz creation")
     
     import uuid
-    from datetime import datetime
     
     try:
         # Use the new AI models for quiz generation
@@ -1326,7 +1398,7 @@ def auto_generate_quiz(request: QuizGenerationRequest):
             "created_by": request.user_id,
             "created_by_teacher": teacher_id,  # For students, track their teacher
             "school_id": school_id,  # Associate with school
-            "created_at": datetime.now().isoformat(),
+            "created_at": now_iso(),
             "total_questions": len(questions),
             "total_points": sum(q.get("points", 1) for q in questions),
             "creation_type": "ai_generated",
@@ -1335,6 +1407,8 @@ def auto_generate_quiz(request: QuizGenerationRequest):
         }
         
         quizzes_db.append(new_quiz)
+        build_answer_key(new_quiz)
+        invalidate_analytics(request.user_id, school_id)
         
         return {
             "message": "AI-generated quiz created successfully",
@@ -1387,9 +1461,12 @@ def delete_quiz(quiz_id: str, user_id: int, user_role: str):
     
     # Remove quiz from database
     quizzes_db[:] = [q for q in quizzes_db if q["id"] != quiz_id]
+    quiz_answer_keys.pop(quiz_id, None)
+    invalidate_analytics(quiz.get("created_by"), quiz.get("school_id"))
     
     # Also remove any quiz results for this quiz
     quiz_results_db[:] = [r for r in quiz_results_db if r.get("quiz_id") != quiz_id]
+    results_by_quiz.pop(quiz_id, None)
     
     return {
         "message": "Quiz deleted successfully",
@@ -1398,9 +1475,14 @@ def delete_quiz(quiz_id: str, user_id: int, user_role: str):
         "deleted_by_role": user_role
     }
 
+# Fields returned from submit_quiz; the full result incl. question_results
+# is served by /api/quiz-results/{result_id}
+RESULT_SUMMARY_FIELDS = ("id", "quiz_id", "score", "max_score", "percentage", "grade",
+                         "grade_letter", "passed", "status", "submitted_at", "message")
+
 class QuizSubmission(BaseModel):
     quiz_id: str
-    answers: list
+    answers: List[str]
     user_id: int
 
 @app.post("/api/quizzes/{quiz_id}/submit")
@@ -1409,38 +1491,30 @@ def submit_quiz(quiz_id: str, submission_data: QuizSubmission):
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
-    # Calculate score
-    total_score = 0
-    max_score = 0
-    answers = submission_data.get("answers", [])
-    user_id = submission_data.get("user_id")
+    answers = submission_data.answers
+    user_id = submission_data.user_id
+    
+    # Score all answers at once against the precomputed answer key
+    correct_answers, question_points = quiz_answer_keys.get(quiz_id) or build_answer_key(quiz)
+    answers = answers[:len(correct_answers)]
+    points = question_points[:len(answers)]
+    is_correct = np.asarray(answers, dtype=object) == correct_answers[:len(answers)]
+    total_score = int((is_correct * points).sum())
+    max_score = int(points.sum())
     
     # Track correct/incorrect answers for detailed results
     question_results = []
-    
-    for i, answer in enumerate(answers):
-        question_id = f"q_{i+1}"  # Use question index as ID
-        user_answer = answer if isinstance(answer, str) else str(answer)
-        
-        # Find question
-        question = next((q for q in quiz["questions"] if q["id"] == question_id), None)
-        if question:
-            points = question.get("points", 1)
-            max_score += points
-            is_correct = user_answer == question.get("correct_answer")
-            
-            if is_correct:
-                total_score += points
-            
-            question_results.append({
-                "question_id": question_id,
-                "question_text": question.get("question_text", ""),
-                "user_answer": user_answer,
-                "correct_answer": question.get("correct_answer", ""),
-                "is_correct": is_correct,
-                "points_earned": points if is_correct else 0,
-                "max_points": points
-            })
+    for i, (user_answer, correct, max_points) in enumerate(zip(answers, is_correct.tolist(), points.tolist())):
+        question = quiz["questions"][i]
+        question_results.append({
+            "question_id": f"q_{i+1}",
+            "question_text": question.get("question_text", ""),
+            "user_answer": user_answer,
+            "correct_answer": question.get("correct_answer", ""),
+            "is_correct": correct,
+            "points_earned": max_points if correct else 0,
+            "max_points": max_points
+        })
     
     percentage = round((total_score / max_score * 100), 2) if max_score > 0 else 0
     
@@ -1463,12 +1537,15 @@ def submit_quiz(quiz_id: str, submission_data: QuizSubmission):
         "passed": passed,
         "status": "PASSED" if passed else "FAILED",
         "question_results": question_results,
-        "submitted_at": datetime.now().isoformat(),
+        "submitted_at": now_iso(),
+        "submission_seq": next(submission_seq),
         "message": f"Quiz submitted successfully! You scored {percentage}% and {'PASSED' if passed else 'FAILED'} with grade {grade_letter}"
     }
     
     # Store result in database
     quiz_results_db.append(result)
+    results_by_quiz.setdefault(quiz_id, []).append(result)
+    invalidate_analytics(quiz.get("created_by"), quiz.get("school_id"))
     
     # Update quiz statistics
     quiz["attempts"] = quiz.get("attempts", 0) + 1
@@ -1476,7 +1553,18 @@ def submit_quiz(quiz_id: str, submission_data: QuizSubmission):
         quiz["average_score"] = 0
     quiz["average_score"] = ((quiz["average_score"] * (quiz["attempts"] - 1)) + percentage) / quiz["attempts"]
     
-    return {"result": result}
+    return {"result": {k: result[k] for k in RESULT_SUMMARY_FIELDS}}
+
+# Lower bounds of each letter grade above F, matching calculate_grade
+GRADE_THRESHOLDS = np.array([60, 63, 67, 70, 73, 77, 80, 83, 87, 90, 93, 97], dtype=np.float64)
+GRADE_LETTERS = ("F", "D-", "D", "D+", "C-", "C", "C+", "B-", "B", "B+", "A-", "A", "A+")
+
+def aggregate_percentages(percentages):
+    """Return (average, pass_count, grade_distribution) for a sequence of percentages"""
+    pct = np.asarray(percentages, dtype=np.float64)
+    bins = np.bincount(np.searchsorted(GRADE_THRESHOLDS, pct, side="right"), minlength=len(GRADE_LETTERS))
+    grade_distribution = {GRADE_LETTERS[i]: int(count) for i, count in enumerate(bins) if count}
+    return float(pct.mean()), int((pct >= 60).sum()), grade_distribution
 
 def calculate_grade(percentage):
     """Calculate grade based on percentage"""
@@ -1554,7 +1642,7 @@ def get_user_quiz_stats(user_id: int):
         grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
     
     # Recent results (last 5)
-    recent_results = sorted(user_results, key=lambda x: x.get("submitted_at", ""), reverse=True)[:5]
+    recent_results = sorted(user_results, key=result_recency, reverse=True)[:5]
     
     return {
         "user_id": user_id,
@@ -1569,17 +1657,20 @@ def get_user_quiz_stats(user_id: int):
 
 # Teacher Analytics Endpoints
 @app.get("/api/analytics/overview")
-def get_analytics_overview(teacher_id: int = None):
+def get_analytics_overview(teacher_id: int = None) -> ORJSONResponse:
     """Get comprehensive analytics overview for teachers"""
     if not teacher_id:
         raise HTTPException(status_code=400, detail="Teacher ID required")
     
+    cached = get_cached_analytics("overview", teacher_id)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     # Get all quizzes created by this teacher
     teacher_quizzes = [q for q in quizzes_db if q.get("created_by") == teacher_id]
     
     # Get all results for these quizzes
-    quiz_ids = [q["id"] for q in teacher_quizzes]
-    all_results = [r for r in quiz_results_db if r.get("quiz_id") in quiz_ids]
+    all_results = [r for q in teacher_quizzes for r in results_by_quiz.get(q["id"], ())]
     
     # Calculate analytics
     total_quizzes = len(teacher_quizzes)
@@ -1587,7 +1678,7 @@ def get_analytics_overview(teacher_id: int = None):
     total_students = len(set(r.get("user_id") for r in all_results))
     
     if total_attempts == 0:
-        return {
+        return ORJSONResponse(cache_analytics("overview", teacher_id, {
             "teacher_id": teacher_id,
             "total_quizzes_created": total_quizzes,
             "total_attempts": 0,
@@ -1599,11 +1690,12 @@ def get_analytics_overview(teacher_id: int = None):
             "grade_distribution": {},
             "subject_performance": {},
             "difficulty_analysis": {}
-        }
+        }))
     
-    # Calculate average score and pass rate
-    average_score = sum(r.get("percentage", 0) for r in all_results) / total_attempts
-    passed_attempts = sum(1 for r in all_results if r.get("passed", False))
+    # Calculate average score, pass rate and grade distribution in one vectorised pass
+    average_score, passed_attempts, grade_distribution = aggregate_percentages(
+        [r.get("percentage", 0) for r in all_results]
+    )
     pass_rate = (passed_attempts / total_attempts) * 100
     
     # Most popular quiz
@@ -1616,19 +1708,13 @@ def get_analytics_overview(teacher_id: int = None):
     most_popular_quiz = next((q for q in teacher_quizzes if q["id"] == most_popular_quiz_id), None)
     
     # Recent activity (last 10 results)
-    recent_activity = sorted(all_results, key=lambda x: x.get("submitted_at", ""), reverse=True)[:10]
-    
-    # Grade distribution
-    grade_distribution = {}
-    for result in all_results:
-        grade = result.get("grade_letter", "F")
-        grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
+    recent_activity = sorted(all_results, key=result_recency, reverse=True)[:10]
     
     # Subject performance
     subject_performance = {}
     for quiz in teacher_quizzes:
         subject = quiz.get("topic", "Unknown")
-        quiz_results = [r for r in all_results if r.get("quiz_id") == quiz["id"]]
+        quiz_results = results_by_quiz.get(quiz["id"])
         if quiz_results:
             avg_score = sum(r.get("percentage", 0) for r in quiz_results) / len(quiz_results)
             subject_performance[subject] = {
@@ -1641,7 +1727,7 @@ def get_analytics_overview(teacher_id: int = None):
     difficulty_analysis = {}
     for quiz in teacher_quizzes:
         difficulty = quiz.get("difficulty", "Unknown")
-        quiz_results = [r for r in all_results if r.get("quiz_id") == quiz["id"]]
+        quiz_results = results_by_quiz.get(quiz["id"])
         if quiz_results:
             avg_score = sum(r.get("percentage", 0) for r in quiz_results) / len(quiz_results)
             difficulty_analysis[difficulty] = {
@@ -1650,7 +1736,7 @@ def get_analytics_overview(teacher_id: int = None):
                 "pass_rate": round((sum(1 for r in quiz_results if r.get("passed", False)) / len(quiz_results)) * 100, 2)
             }
     
-    return {
+    return ORJSONResponse(cache_analytics("overview", teacher_id, {
         "teacher_id": teacher_id,
         "total_quizzes_created": total_quizzes,
         "total_attempts": total_attempts,
@@ -1662,20 +1748,20 @@ def get_analytics_overview(teacher_id: int = None):
         "grade_distribution": grade_distribution,
         "subject_performance": subject_performance,
         "difficulty_analysis": difficulty_analysis
-    }
+    }))
 
 @app.get("/api/analytics/quiz/{quiz_id}")
-def get_quiz_analytics(quiz_id: str):
+def get_quiz_analytics(quiz_id: str) -> ORJSONResponse:
     """Get detailed analytics for a specific quiz"""
     quiz = next((q for q in quizzes_db if q["id"] == quiz_id), None)
     if not quiz:
         raise HTTPException(status_code=404, detail="Quiz not found")
     
     # Get all results for this quiz
-    quiz_results = [r for r in quiz_results_db if r.get("quiz_id") == quiz_id]
+    quiz_results = results_by_quiz.get(quiz_id, [])
     
     if not quiz_results:
-        return {
+        return ORJSONResponse({
             "quiz_id": quiz_id,
             "quiz_title": quiz["title"],
             "total_attempts": 0,
@@ -1684,20 +1770,15 @@ def get_quiz_analytics(quiz_id: str):
             "grade_distribution": {},
             "question_analysis": [],
             "student_performance": []
-        }
+        })
     
-    # Calculate basic stats
+    # Calculate basic stats and grade distribution
     total_attempts = len(quiz_results)
-    average_score = sum(r.get("percentage", 0) for r in quiz_results) / total_attempts
-    passed_attempts = sum(1 for r in quiz_results if r.get("passed", False))
+    average_score, passed_attempts, grade_distribution = aggregate_percentages(
+        [r.get("percentage", 0) for r in quiz_results]
+    )
     pass_rate = (passed_attempts / total_attempts) * 100
     
-    # Grade distribution
-    grade_distribution = {}
-    for result in quiz_results:
-        grade = result.get("grade_letter", "F")
-        grade_distribution[grade] = grade_distribution.get(grade, 0) + 1
-    
     # Question analysis
     question_analysis = []
     for i, question in enumerate(quiz.get("questions", [])):
@@ -1729,7 +1810,7 @@ def get_quiz_analytics(quiz_id: str):
             "submitted_at": result.get("submitted_at")
         })
     
-    return {
+    return ORJSONResponse({
         "quiz_id": quiz_id,
         "quiz_title": quiz["title"],
         "total_attempts": total_attempts,
@@ -1738,20 +1819,23 @@ def get_quiz_analytics(quiz_id: str):
         "grade_distribution": grade_distribution,
         "question_analysis": question_analysis,
         "student_performance": student_performance
-    }
+    })
 
 @app.get("/api/analytics/students")
-def get_student_analytics(teacher_id: int = None):
+def get_student_analytics(teacher_id: int = None) -> ORJSONResponse:
     """Get analytics for all students who took teacher's quizzes"""
     if not teacher_id:
         raise HTTPException(status_code=400, detail="Teacher ID required")
     
+    cached = get_cached_analytics("students", teacher_id)
+    if cached is not None:
+        return ORJSONResponse(cached)
+    
     # Get all quizzes created by this teacher
     teacher_quizzes = [q for q in quizzes_db if q.get("created_by") == teacher_id]
-    quiz_ids = [q["id"] for q in teacher_quizzes]
     
     # Get all results for these quizzes
-    all_results = [r for r in quiz_results_db if r.get("quiz_id") in quiz_ids]
+    all_results = [r for q in teacher_quizzes for r in results_by_quiz.get(q["id"], ())]
     
     # Group results by student
     student_results = {}
@@ -1775,7 +1859,7 @@ def get_student_analytics(teacher_id: int = None):
         pass_rate = (passed_quizzes / total_quizzes) * 100
         
         # Recent activity
-        recent_quiz = max(results, key=lambda x: x.get("submitted_at", ""))
+        recent_quiz = max(results, key=result_recency)
         
         student_analytics.append({
             "user_id": user_id,
@@ -1792,11 +1876,11 @@ def get_student_analytics(teacher_id: int = None):
     # Sort by average score descending
     student_analytics.sort(key=lambda x: x["average_score"], reverse=True)
     
-    return {
+    return ORJSONResponse(cache_analytics("students", teacher_id, {
         "teacher_id": teacher_id,
         "total_students": len(student_analytics),
         "students": student_analytics
-    }
+    }))
 
 # AI Model Management Endpoints
 @app.get("/api/ai/status")
@@ -1912,7 +1996,7 @@ def generate_school_quiz(school_id: str, quiz_data: QuizGenerationRequest):
             "is_public": quiz_data.is_public,
             "school_id": school_id,
             "created_by": quiz_data.user_id,
-            "created_at": datetime.now().isoformat(),
+            "created_at": now_iso(),
             "total_questions": len(questions),
             "total_points": len(questions) * 2,
             "creation_type": "ai_generated",
@@ -1923,6 +2007,7 @@ def generate_school_quiz(school_id: str, quiz_data: QuizGenerationRequest):
         # Add to both global and school-specific storage
         quizzes_db.append(quiz)
         school_quizzes_db[school_id].append(quiz)
+        invalidate_analytics(quiz_data.user_id, school_id)
         
         return {
             "message": "School quiz created successfully",
@@ -1935,6 +2020,10 @@ def generate_school_quiz(school_id: str, quiz_data: QuizGenerationRequest):
 @app.get("/api/schools/{school_id}/analytics")
 def get_school_analytics(school_id: str):
     """Get analytics for a specific school"""
+    cached = get_cached_analytics("school", school_id)
+    if cached is not None:
+        return cached
+    
     school = next((s for s in schools_db if s["id"] == school_id), None)
     if not school:
         raise HTTPException(status_code=404, detail="School not found")
@@ -1964,7 +2053,7 @@ def get_school_analytics(school_id: str):
         total_score = sum(r.get("percentage", 0) for r in school_results)
         analytics["average_quiz_score"] = round(total_score / len(school_results), 2)
     
-    return {"analytics": analytics}
+    return cache_analytics("school", school_id, {"analytics": analytics})
 
 @app.post("/api/ai/generate-test")
 def generate_test_quiz(request: QuizGenerationRequest):
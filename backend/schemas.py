@@ -1,6 +1,7 @@
 from pydantic import BaseModel, EmailStr
 from typing import Optional, List, Dict, Any
 from datetime import datetime
+from dataclasses import dataclass
 from enum import Enum
 
 class UserRole(str, Enum):
@@ -209,12 +210,15 @@ class QuizGenerationRequest(BaseModel):
     num_questions: int = 10
     time_limit: Optional[int] = None
 
-class TableOfContentsResponse(BaseModel):
+# Outgoing-only shapes are never parsed from client input, so plain slotted dataclasses skip validation cost
+@dataclass(slots=True)
+class TableOfContentsResponse:
     chapters: List[ChapterCreate]
     topics: List[TopicCreate]
     subtopics: List[SubtopicCreate]
 
-class QuestionGenerationResponse(BaseModel):
+@dataclass(slots=True)
+class QuestionGenerationResponse:
     questions: List[QuestionCreate]
 
 # Notification Schemas
@@ -236,7 +240,8 @@ class Notification(NotificationBase):
         from_attributes = True
 
 # Analytics Schemas
-class PerformanceAnalytics(BaseModel):
+@dataclass(slots=True)
+class PerformanceAnalytics:
     overall_average: float
     chapter_analytics: Dict[str, Dict[str, Any]]
     topic_analytics: Dict[str, Dict[str, Any]]
@@ -4,25 +4,35 @@ School-Enabled Production Backend for AI-Powered Quiz System
 Multi-tenant system with school isolation and realistic features
 """
 
-from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel, validator
-from typing import Optional, List, Dict, Any
+from typing import Annotated, AsyncIterator, Iterable, Optional, List, Dict, Any
 import json
+import orjson
+import hashlib
 import os
 import time
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 import asyncio
 import uvicorn
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, wraps
+from contextvars import ContextVar
+import inspect
+from collections import OrderedDict
+from itertools import islice
+from types import MappingProxyType
 
 # Import our modules
 from ai_models import ai_quiz_generator
 from env_config import DEFAULT_AI_MODEL, print_ai_status
 from security import (
-    get_password_hash, verify_password, create_access_token, create_refresh_token,
+    get_password_hash, create_access_token, create_refresh_token,
+    verify_password_hash, is_password_verify_cached, remember_verified_password,
     verify_token, get_current_user, require_roles, validate_password_strength,
     validate_quiz_data, sanitize_input, add_security_headers
 )
@@ -30,6 +40,7 @@ from rate_limiter import (
     limiter, create_rate_limit_decorator, check_ai_usage_limit, 
     get_usage_stats, track_ai_usage
 )
+from slowapi.errors import RateLimitExceeded
 from monitoring import (
     MonitoringMiddleware, AnalyticsTracker, PerformanceMonitor,
     UserAction, collect_metrics_periodically
@@ -42,25 +53,67 @@ from school_system import (
 # Load environment variables
 load_dotenv()
 
+# Environment settings are fixed after startup; read them once here
+DEBUG_MODE = os.getenv("DEBUG", "False").lower() == "true"
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "https://yourdomain.com").split(",")
+GEMINI_STATUS = "available" if os.getenv("GEMINI_API_KEY") else "unavailable"
+GROK_STATUS = "available" if os.getenv("GROK_API_KEY") else "unavailable"
+
+# orjson serializes dataclasses, naive datetimes (as UTC) and numpy arrays natively
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_DATACLASS | orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z | orjson.OPT_SERIALIZE_NUMPY
+
+def orjson_default(obj):
+    """Serialize the few types orjson has no native path for"""
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, MappingProxyType):
+        return dict(obj)
+    raise TypeError
+
+class FastORJSONResponse(ORJSONResponse):
+    """ORJSONResponse with fixed options; returning it directly skips FastAPI's jsonable_encoder"""
+    
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+# Lists longer than this are streamed in batches instead of serialized into one buffer
+STREAM_THRESHOLD = 200
+STREAM_BATCH_SIZE = 100
+
+async def stream_json_list(key: str, items: Iterable[Any], extra: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """Stream {key: [...items], **extra} as JSON, serializing one batch of items at a time"""
+    items = iter(items)
+    yield b'{"' + key.encode() + b'":['
+    first = True
+    while batch_items := list(islice(items, STREAM_BATCH_SIZE)):
+        batch = b",".join(
+            orjson.dumps(item, default=orjson_default, option=ORJSON_OPTIONS)
+            for item in batch_items
+        )
+        yield batch if first else b"," + batch
+        first = False
+    yield b"]," + orjson.dumps(extra, default=orjson_default, option=ORJSON_OPTIONS)[1:]
+
 # Initialize FastAPI app
 app = FastAPI(
     title="AI-Powered Quiz System - School Edition",
     description="Multi-tenant quiz system with school isolation and management",
     version="3.0.0",
-    docs_url="/docs" if os.getenv("DEBUG", "False").lower() == "true" else None,
-    redoc_url="/redoc" if os.getenv("DEBUG", "False").lower() == "true" else None
+    default_response_class=FastORJSONResponse,
+    docs_url="/docs" if DEBUG_MODE else None,
+    redoc_url="/redoc" if DEBUG_MODE else None
 )
 
 # Security middleware
 app.add_middleware(
     TrustedHostMiddleware, 
-    allowed_hosts=["*"] if os.getenv("DEBUG", "False").lower() == "true" else ["yourdomain.com", "*.yourdomain.com"]
+    allowed_hosts=["*"] if DEBUG_MODE else ["yourdomain.com", "*.yourdomain.com"]
 )
 
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=os.getenv("CORS_ORIGINS", "https://yourdomain.com").split(","),
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
@@ -71,15 +124,169 @@ app.add_middleware(MonitoringMiddleware)
 
 # Rate limiting
 app.state.limiter = limiter
-app.add_exception_handler(429, lambda request, exc: JSONResponse(
-    status_code=429,
-    content={"error": "Rate limit exceeded", "retry_after": exc.retry_after}
-))
+
+# Prebuilt body so a flood of limited requests allocates nothing but the Retry-After header
+RATE_LIMIT_BODY = orjson.dumps({"error": "Rate limit exceeded"})
+
+def rate_limit_exceeded_handler(request: Request, exc: RateLimitExceeded) -> Response:
+    """Return the prebuilt rate limit response with the limit window as Retry-After"""
+    return Response(
+        content=RATE_LIMIT_BODY,
+        status_code=429,
+        media_type="application/json",
+        headers={"Retry-After": str(exc.limit.limit.get_expiry())}
+    )
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded_handler)
 
 # Global instances
 analytics_tracker = AnalyticsTracker()
 performance_monitor = PerformanceMonitor()
 
+# bcrypt is pure CPU work; run it in worker processes so it never blocks the event loop
+HASH_POOL = ProcessPoolExecutor(max_workers=os.cpu_count())
+
+async def run_in_hash_pool(func, *args):
+    """Run a password hashing/verification call in the hash process pool"""
+    return await asyncio.get_running_loop().run_in_executor(HASH_POOL, func, *args)
+
+# Strong references to fire-and-forget tasks so they are not garbage collected mid-run
+background_tasks = set()
+
+def run_in_background(func, *args, **kwargs):
+    """Run a blocking post-response call (e.g. analytics tracking) without delaying the response"""
+    async def runner():
+        try:
+            await asyncio.to_thread(func, *args, **kwargs)
+        except Exception as e:
+            print(f"Background task {func.__name__} failed: {e}")
+    
+    task = asyncio.create_task(runner())
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+# User actions are queued by the handlers and written to the tracker in batches
+ANALYTICS_BATCH_SIZE = 256
+ANALYTICS_FLUSH_INTERVAL = 1.0  # seconds
+analytics_queue: asyncio.Queue = asyncio.Queue()
+analytics_flush_task = None
+
+async def flush_analytics_queue():
+    """Drain queued user actions and write them to the tracker in bulk"""
+    while not analytics_queue.empty():
+        batch = []
+        while len(batch) < ANALYTICS_BATCH_SIZE:
+            try:
+                batch.append(analytics_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        try:
+            await asyncio.to_thread(analytics_tracker.track_user_actions_bulk, batch)
+        except Exception as e:
+            print(f"Analytics flush failed for {len(batch)} actions: {e}")
+
+async def flush_analytics_periodically():
+    """Flush the analytics queue on a fixed interval"""
+    while True:
+        await asyncio.sleep(ANALYTICS_FLUSH_INTERVAL)
+        await flush_analytics_queue()
+
+# Authenticated user claims; FastAPI resolves this once per request and shares it across sub-dependencies
+CurrentUser = Annotated[Dict[str, Any], Depends(get_current_user, use_cache=True)]
+
+# Per-request tracking state filled in by tracked endpoints through track()
+current_tracking: ContextVar[Dict[str, Any]] = ContextVar("current_tracking")
+
+def track(user_id: Any, **details):
+    """Set the user and details reported for the current tracked action"""
+    tracking = current_tracking.get()
+    tracking["user_id"] = user_id
+    tracking["details"] = details
+
+def tracked(action: str, error_status: int = 400):
+    """Queue one UserAction per endpoint call and map unexpected errors to error_status"""
+    def decorator(func):
+        # Resolve which context the endpoint receives once, not per request
+        params = inspect.signature(func).parameters
+        has_request = "request" in params
+        has_user = "current_user" in params
+        
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start_time = time.perf_counter()
+            current_user = kwargs["current_user"] if has_user else None
+            tracking = {"user_id": current_user["user_id"] if current_user else 0, "details": {}}
+            token = current_tracking.set(tracking)
+            success = False
+            
+            try:
+                response = await func(*args, **kwargs)
+                success = True
+                return response
+            except HTTPException as e:
+                tracking["details"] = {"error": e.detail}
+                raise
+            except Exception as e:
+                tracking["details"] = {"error": str(e)}
+                raise HTTPException(status_code=error_status, detail=str(e))
+            finally:
+                current_tracking.reset(token)
+                request = kwargs["request"] if has_request else None
+                analytics_queue.put_nowait(UserAction(
+                    user_id=tracking["user_id"],
+                    action=action if success else f"{action}_failed",
+                    timestamp=time.time_ns(),
+                    details=tracking["details"],
+                    ip_address=request.client.host if request and request.client else "unknown",
+                    user_agent=request.headers.get("user-agent", "unknown") if request else "unknown",
+                    success=success,
+                    response_time=time.perf_counter() - start_time
+                ))
+        
+        return wrapper
+    return decorator
+
+# Generated questions keyed by normalized generation parameters, so identical requests skip the AI call
+QUIZ_CACHE_TTL = 86400  # seconds
+QUIZ_CACHE_MAX_SIZE = 10000
+quiz_generation_cache = OrderedDict()  # key -> (expires_at, questions)
+
+def quiz_cache_key(school_id: str, subject: str, difficulty: str, num_questions: int, topic: Optional[str]) -> str:
+    """Build a cache key for quiz generation; scoped per school so schools don't share question sets"""
+    params = (school_id, subject.strip().lower(), difficulty.strip().lower(), num_questions, (topic or "").strip().lower())
+    return hashlib.blake2b(orjson.dumps(params), digest_size=16).hexdigest()
+
+def get_cached_questions(key: str) -> Optional[List[Dict[str, Any]]]:
+    """Return a copy of recently generated questions for this key, or None on a miss"""
+    cached = quiz_generation_cache.get(key)
+    if cached and cached[0] > time.time():
+        quiz_generation_cache.move_to_end(key)
+        return [dict(q) for q in cached[1]]
+    return None
+
+async def generate_questions_cached(school_id: str, subject: str, difficulty: str, num_questions: int,
+                                    topic: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Generate quiz questions, reusing a recent result for the same parameters"""
+    key = quiz_cache_key(school_id, subject, difficulty, num_questions, topic)
+    cached = get_cached_questions(key)
+    if cached is not None:
+        return cached
+    
+    questions = await ai_quiz_generator.generate_quiz_questions_async(
+        subject=subject,
+        difficulty=difficulty,
+        num_questions=num_questions,
+        topic=topic
+    )
+    
+    if questions:
+        quiz_generation_cache[key] = (time.time() + QUIZ_CACHE_TTL, [dict(q) for q in questions])
+        quiz_generation_cache.move_to_end(key)
+        while len(quiz_generation_cache) > QUIZ_CACHE_MAX_SIZE:
+            quiz_generation_cache.popitem(last=False)
+    
+    return questions
+
 # In-memory storage (replace with PostgreSQL in production)
 users_db = {}
 sessions_db = {}
@@ -103,90 +310,97 @@ class QuizGenerationRequest(BaseModel):
     due_date: Optional[str] = None
     max_attempts: int = 3
 
-class TokenResponse(BaseModel):
-    access_token: str
-    refresh_token: str
-    token_type: str = "bearer"
-    expires_in: int = 1800
-    user_info: Dict[str, Any]
+# Static status payloads
+HEALTH_FEATURES = {
+    "multi_tenant": True,
+    "school_isolation": True,
+    "ai_models": {
+        "gemini": GEMINI_STATUS,
+        "huggingface": "available",
+        "free": "available"
+    }
+}
+
+AI_STATUS_PAYLOAD = orjson.dumps({
+    "models": {
+        "gemini": GEMINI_STATUS,
+        "huggingface": "available",
+        "free": "available",
+        "grok": GROK_STATUS
+    },
+    "default_model": DEFAULT_AI_MODEL,
+    "status": "operational",
+    "features": {
+        "multi_tenant": True,
+        "school_isolation": True,
+        "grade_level_support": True
+    }
+})
+
+# Serialized health payload, rebuilt at most once per second
+_health_cache = (0, b"")
+
+def health_payload() -> bytes:
+    """Get the serialized health payload with a timestamp at 1s resolution"""
+    global _health_cache
+    second = int(time.time())
+    if _health_cache[0] != second:
+        _health_cache = (second, orjson.dumps({
+            "status": "healthy",
+            "timestamp": datetime.utcnow().isoformat(),
+            "version": "3.0.0",
+            "features": HEALTH_FEATURES
+        }))
+    return _health_cache[1]
+
+@lru_cache(maxsize=64)
+def public_schools_payload(limit: int, version: int) -> bytes:
+    """Get the serialized public school directory for a directory version"""
+    public_schools = school_system.public_schools
+    return orjson.dumps({
+        "schools": public_schools[:limit],
+        "total": len(public_schools)
+    })
+
+# Only these fields are checked by validate_quiz_data; skip dumping the rest of the request
+QUIZ_VALIDATION_FIELDS = {"title", "description", "subject", "difficulty", "num_questions"}
 
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     """Health check endpoint for load balancers"""
-    return {
-        "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
-        "version": "3.0.0",
-        "features": {
-            "multi_tenant": True,
-            "school_isolation": True,
-            "ai_models": {
-                "gemini": "available" if os.getenv("GEMINI_API_KEY") else "unavailable",
-                "huggingface": "available",
-                "free": "available"
-            }
-        }
-    }
+    return Response(content=health_payload(), media_type="application/json")
 
 # ==================== SCHOOL MANAGEMENT ENDPOINTS ====================
 
 @app.post("/api/schools/register")
 @limiter.limit("3/hour")  # Limit school registrations
+@tracked("school_registration")
 async def register_school(request: Request, school_data: SchoolRegistration, admin_data: SchoolAdminRegistration):
     """Register a new school with admin"""
-    start_time = time.time()
+    # Hash admin password
+    admin_data.password = await run_in_hash_pool(get_password_hash, admin_data.password)
     
-    try:
-        # Hash admin password
-        admin_data.password = get_password_hash(admin_data.password)
-        
-        # Create school
-        result = school_system.create_school(school_data, admin_data)
-        
-        # Track school registration
-        response_time = time.time() - start_time
-        user_action = UserAction(
-            user_id=result["admin"]["id"],
-            action="school_registration",
-            timestamp=datetime.utcnow(),
-            details={
-                "school_id": result["school"]["id"],
-                "school_name": result["school"]["name"],
-                "school_type": result["school"]["type"]
-            },
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=True,
-            response_time=response_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        return {
-            "message": "School registered successfully",
-            "school": result["school"],
-            "admin": {
-                "id": result["admin"]["id"],
-                "name": result["admin"]["name"],
-                "email": result["admin"]["email"],
-                "role": result["admin"]["role"]
-            }
+    # Create school
+    result = school_system.create_school(school_data, admin_data)
+    
+    track(
+        result["admin"]["id"],
+        school_id=result["school"]["id"],
+        school_name=result["school"]["name"],
+        school_type=result["school"]["type"]
+    )
+    
+    return FastORJSONResponse({
+        "message": "School registered successfully",
+        "school": result["school"],
+        "admin": {
+            "id": result["admin"]["id"],
+            "name": result["admin"]["name"],
+            "email": result["admin"]["email"],
+            "role": result["admin"]["role"]
         }
-        
-    except Exception as e:
-        user_action = UserAction(
-            user_id=0,
-            action="school_registration_failed",
-            timestamp=datetime.utcnow(),
-            details={"error": str(e)},
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=False,
-            response_time=time.time() - start_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        raise HTTPException(status_code=400, detail=str(e))
+    })
 
 @app.get("/api/schools/search")
 async def search_schools(
@@ -197,11 +411,11 @@ async def search_schools(
     """Search for schools"""
     try:
         results = school_system.search_schools(q, school_type)
-        return {
+        return FastORJSONResponse({
             "schools": results[:limit],
             "total": len(results),
             "query": q
-        }
+        })
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -210,7 +424,7 @@ async def get_school_info(school_id: str):
     """Get school information"""
     try:
         school_info = school_system.get_school_info(school_id)
-        return {"school": school_info}
+        return FastORJSONResponse({"school": school_info})
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
@@ -218,246 +432,195 @@ async def get_school_info(school_id: str):
 
 @app.post("/api/schools/{school_id}/teachers/register")
 @limiter.limit("10/hour")
+@tracked("teacher_registration")
 async def register_teacher(
     request: Request,
     school_id: str,
     teacher_data: TeacherRegistration
 ):
     """Register a teacher for a school"""
-    start_time = time.time()
+    # Hash password
+    teacher_data.password = await run_in_hash_pool(get_password_hash, teacher_data.password)
     
-    try:
-        # Hash password
-        teacher_data.password = get_password_hash(teacher_data.password)
-        
-        # Add teacher to school
-        result = school_system.add_teacher_to_school(teacher_data, school_id)
-        
-        # Track teacher registration
-        response_time = time.time() - start_time
-        user_action = UserAction(
-            user_id=result["teacher"]["id"],
-            action="teacher_registration",
-            timestamp=datetime.utcnow(),
-            details={
-                "school_id": school_id,
-                "subject_specialization": teacher_data.subject_specialization
-            },
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=True,
-            response_time=response_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        return {
-            "message": "Teacher registered successfully",
-            "teacher": result["teacher"]
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Add teacher to school
+    result = school_system.add_teacher_to_school(teacher_data, school_id)
+    
+    track(
+        result["teacher"]["id"],
+        school_id=school_id,
+        subject_specialization=teacher_data.subject_specialization
+    )
+    
+    return FastORJSONResponse({
+        "message": "Teacher registered successfully",
+        "teacher": result["teacher"]
+    })
 
 @app.post("/api/schools/{school_id}/students/register")
 @limiter.limit("20/hour")
+@tracked("student_registration")
 async def register_student(
     request: Request,
     school_id: str,
     student_data: StudentRegistration
 ):
     """Register a student for a school"""
-    start_time = time.time()
+    # Hash password
+    student_data.password = await run_in_hash_pool(get_password_hash, student_data.password)
     
-    try:
-        # Hash password
-        student_data.password = get_password_hash(student_data.password)
-        
-        # Enroll student
-        result = school_system.enroll_student(student_data, school_id)
-        
-        # Track student registration
-        response_time = time.time() - start_time
-        user_action = UserAction(
-            user_id=result["student"]["id"],
-            action="student_registration",
-            timestamp=datetime.utcnow(),
-            details={
-                "school_id": school_id,
-                "grade_level": student_data.grade_level
-            },
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=True,
-            response_time=response_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        return {
-            "message": "Student enrolled successfully",
-            "student": result["student"],
-            "enrollment": result["enrollment"]
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    # Enroll student
+    result = school_system.enroll_student(student_data, school_id)
+    
+    track(
+        result["student"]["id"],
+        school_id=school_id,
+        grade_level=student_data.grade_level
+    )
+    
+    return FastORJSONResponse({
+        "message": "Student enrolled successfully",
+        "student": result["student"],
+        "enrollment": result["enrollment"]
+    })
 
 # ==================== AUTHENTICATION ENDPOINTS ====================
 
-@app.post("/api/auth/login", response_model=TokenResponse)
+@app.post("/api/auth/login")
 @limiter.limit("10/hour")
+@tracked("login", error_status=401)
 async def login(request: Request, login_data: UserLogin):
     """User login with school context"""
-    start_time = time.time()
+    # Find user in school system
+    user = school_system.users_by_email.get(login_data.email)
     
-    try:
-        # Find user in school system
-        user = None
-        for u in school_system.users.values():
-            if u["email"] == login_data.email:
-                user = u
-                break
-        
-        if not user or not verify_password(login_data.password, user["hashed_password"]):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    
+    # Verify cache is per process, so consult and fill it here rather than inside the hash pool workers
+    if not is_password_verify_cached(login_data.password, user["password"]):
+        if not await run_in_hash_pool(verify_password_hash, login_data.password, user["password"]):
             raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        if not user.get("is_active", True):
-            raise HTTPException(status_code=401, detail="Account is deactivated")
-        
-        # Create tokens
-        access_token = create_access_token(
-            data={
-                "sub": str(user["id"]), 
-                "email": user["email"], 
-                "role": user["role"], 
-                "username": user["name"],
-                "school_id": user.get("school_id")
-            }
-        )
-        refresh_token = create_refresh_token(
-            data={"sub": str(user["id"]), "email": user["email"]}
-        )
-        
-        # Track login
-        response_time = time.time() - start_time
-        user_action = UserAction(
-            user_id=user["id"],
-            action="login",
-            timestamp=datetime.utcnow(),
-            details={
-                "role": user["role"],
-                "school_id": user.get("school_id")
-            },
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=True,
-            response_time=response_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        return TokenResponse(
-            access_token=access_token,
-            refresh_token=refresh_token,
-            expires_in=1800,
-            user_info={
-                "id": user["id"],
-                "name": user["name"],
-                "email": user["email"],
-                "role": user["role"],
-                "school_id": user.get("school_id"),
-                "school_name": school_system.schools.get(user.get("school_id", ""), {}).get("name", "N/A")
-            }
-        )
-        
-    except Exception as e:
-        user_action = UserAction(
-            user_id=0,
-            action="login_failed",
-            timestamp=datetime.utcnow(),
-            details={"error": str(e)},
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=False,
-            response_time=time.time() - start_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        raise HTTPException(status_code=401, detail=str(e))
+        remember_verified_password(login_data.password, user["password"])
+    
+    if not user.get("is_active", True):
+        raise HTTPException(status_code=401, detail="Account is deactivated")
+    
+    # Create tokens
+    access_token = create_access_token(
+        data={
+            "sub": str(user["id"]), 
+            "email": user["email"], 
+            "role": user["role"], 
+            "username": user["name"],
+            "school_id": user.get("school_id")
+        }
+    )
+    refresh_token = create_refresh_token(
+        data={"sub": str(user["id"]), "email": user["email"]}
+    )
+    
+    track(user["id"], role=user["role"], school_id=user.get("school_id"))
+    
+    return FastORJSONResponse({
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": 1800,
+        "user_info": {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"],
+            "role": user["role"],
+            "school_id": user.get("school_id"),
+            "school_name": user.get("school_name", "N/A")
+        }
+    })
 
 # ==================== QUIZ ENDPOINTS ====================
 
 @app.get("/api/schools/{school_id}/quizzes")
+@tracked("view_school_quizzes")
 async def get_school_quizzes(
     school_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: CurrentUser,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1)
 ):
     """Get quizzes for a specific school"""
-    try:
-        quizzes = school_system.get_school_quizzes(
-            school_id, 
-            current_user["role"], 
-            current_user["user_id"]
-        )
-        
-        # Track quiz viewing
-        user_action = UserAction(
-            user_id=current_user["user_id"],
-            action="view_school_quizzes",
-            timestamp=datetime.utcnow(),
-            details={
-                "school_id": school_id,
-                "quiz_count": len(quizzes)
-            },
-            ip_address="unknown",
-            user_agent="unknown",
-            success=True,
-            response_time=0.0
+    total, page = school_system.iter_school_quizzes(
+        school_id, 
+        current_user["role"], 
+        current_user["user_id"],
+        offset,
+        limit
+    )
+    remaining = max(0, total - offset)
+    page_size = remaining if limit is None else min(limit, remaining)
+    
+    track(current_user["user_id"], school_id=school_id, quiz_count=total)
+    
+    if page_size > STREAM_THRESHOLD:
+        # Take references up front: the stream awaits between batches, and a quiz
+        # created meanwhile would change the underlying dict mid-iteration
+        return StreamingResponse(
+            stream_json_list("quizzes", list(page), {"total": total, "school_id": school_id}),
+            media_type="application/json"
         )
-        analytics_tracker.track_user_action(user_action)
-        
-        return {
-            "quizzes": quizzes,
-            "total": len(quizzes),
-            "school_id": school_id
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    
+    return FastORJSONResponse({
+        "quizzes": list(page),
+        "total": total,
+        "school_id": school_id
+    })
 
 @app.post("/api/schools/{school_id}/quizzes/auto-generate")
 @limiter.limit("5/hour")  # Rate limit for AI generation
+@tracked("create_school_quiz", error_status=500)
 async def generate_school_quiz(
     request: Request,
     school_id: str,
     quiz_data: QuizGenerationRequest,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """Generate quiz for specific school using AI"""
-    start_time = time.time()
-    
+    model_used = DEFAULT_AI_MODEL
     try:
-        # Check AI usage limits
-        if not check_ai_usage_limit(current_user["user_id"], current_user["role"]):
-            usage_stats = get_usage_stats(current_user["user_id"], current_user["role"])
-            raise HTTPException(
-                status_code=429,
-                detail=f"AI usage limit exceeded. You have used {usage_stats['ai_usage']}/{usage_stats['limit']} requests. Reset in {usage_stats['reset_in']} seconds."
-            )
-        
         # Validate quiz data
-        validation = validate_quiz_data(quiz_data.dict())
+        validation = validate_quiz_data(quiz_data.model_dump(include=QUIZ_VALIDATION_FIELDS))
         if not validation["is_valid"]:
             raise HTTPException(status_code=400, detail=f"Validation failed: {', '.join(validation['errors'])}")
         
         sanitized_data = validation["sanitized_data"]
         
-        # Generate quiz using AI
-        print(f"Generating school quiz using {DEFAULT_AI_MODEL} AI model...")
-        questions = ai_quiz_generator.generate_quiz_questions(
-            subject=sanitized_data["subject"],
-            difficulty=sanitized_data["difficulty"],
-            num_questions=sanitized_data["num_questions"],
-            topic=sanitized_data.get("topic")
-        )
+        # A cached result makes no AI call, so it neither charges the AI quota nor counts as model usage
+        questions = get_cached_questions(quiz_cache_key(
+            school_id,
+            sanitized_data["subject"],
+            sanitized_data["difficulty"],
+            sanitized_data["num_questions"],
+            sanitized_data.get("topic")
+        ))
+        
+        if questions is not None:
+            model_used = "cache"
+        else:
+            # Check AI usage limits (sync Redis round trips, so keep them off the event loop)
+            if not await asyncio.to_thread(check_ai_usage_limit, current_user["user_id"], current_user["role"]):
+                usage_stats = await asyncio.to_thread(get_usage_stats, current_user["user_id"], current_user["role"])
+                raise HTTPException(
+                    status_code=429,
+                    detail=f"AI usage limit exceeded. You have used {usage_stats['ai_usage']}/{usage_stats['limit']} requests. Reset in {usage_stats['reset_in']} seconds."
+                )
+            
+            # Generate quiz using AI
+            print(f"Generating school quiz using {DEFAULT_AI_MODEL} AI model...")
+            questions = await generate_questions_cached(
+                school_id=school_id,
+                subject=sanitized_data["subject"],
+                difficulty=sanitized_data["difficulty"],
+                num_questions=sanitized_data["num_questions"],
+                topic=sanitized_data.get("topic")
+            )
         
         if not questions:
             raise HTTPException(status_code=500, detail="Failed to generate quiz questions")
@@ -480,64 +643,54 @@ async def generate_school_quiz(
         
         result = school_system.create_school_quiz(quiz_dict, school_id, current_user["user_id"])
         
-        # Track AI usage
-        analytics_tracker.track_ai_usage(
-            user_id=current_user["user_id"],
-            model=DEFAULT_AI_MODEL,
-            subject=sanitized_data["subject"],
-            num_questions=len(questions),
-            success=True
-        )
-        
-        # Track quiz creation
-        response_time = time.time() - start_time
-        user_action = UserAction(
-            user_id=current_user["user_id"],
-            action="create_school_quiz",
-            timestamp=datetime.utcnow(),
-            details={
-                "school_id": school_id,
-                "quiz_id": result["quiz"]["id"],
-                "subject": sanitized_data["subject"],
-                "difficulty": sanitized_data["difficulty"],
-                "num_questions": len(questions),
-                "model": DEFAULT_AI_MODEL
-            },
-            ip_address=request.client.host if request.client else "unknown",
-            user_agent=request.headers.get("user-agent", "unknown"),
-            success=True,
-            response_time=response_time
-        )
-        analytics_tracker.track_user_action(user_action)
-        
-        return {
-            "message": "School quiz created successfully",
-            "quiz": result["quiz"]
-        }
-        
-    except Exception as e:
+    except Exception:
         # Track failed AI usage
-        analytics_tracker.track_ai_usage(
+        run_in_background(
+            analytics_tracker.track_ai_usage,
             user_id=current_user["user_id"],
-            model=DEFAULT_AI_MODEL,
+            model=model_used,
             subject=quiz_data.subject,
             num_questions=quiz_data.num_questions,
             success=False
         )
-        
-        raise HTTPException(status_code=500, detail=str(e))
+        raise
+    
+    # Track AI usage
+    run_in_background(
+        analytics_tracker.track_ai_usage,
+        user_id=current_user["user_id"],
+        model=model_used,
+        subject=sanitized_data["subject"],
+        num_questions=len(questions),
+        success=True
+    )
+    
+    track(
+        current_user["user_id"],
+        school_id=school_id,
+        quiz_id=result["quiz"]["id"],
+        subject=sanitized_data["subject"],
+        difficulty=sanitized_data["difficulty"],
+        num_questions=len(questions),
+        model=model_used
+    )
+    
+    return FastORJSONResponse({
+        "message": "School quiz created successfully",
+        "quiz": result["quiz"]
+    })
 
 # ==================== ANALYTICS ENDPOINTS ====================
 
 @app.get("/api/schools/{school_id}/analytics")
 async def get_school_analytics(
     school_id: str,
-    current_user: Dict[str, Any] = Depends(get_current_user)
+    current_user: CurrentUser
 ):
     """Get analytics for a specific school"""
     try:
         analytics = school_system.get_school_analytics(school_id, current_user["user_id"])
-        return {"analytics": analytics, "school_id": school_id}
+        return FastORJSONResponse({"analytics": analytics, "school_id": school_id})
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -547,23 +700,8 @@ async def get_school_analytics(
 async def get_public_schools(limit: int = 50):
     """Get public school information for discovery"""
     try:
-        public_schools = []
-        for school in school_system.schools.values():
-            if school.get("is_active", True):
-                public_schools.append({
-                    "id": school["id"],
-                    "name": school["name"],
-                    "type": school["type"],
-                    "city": school["city"],
-                    "state": school["state"],
-                    "country": school["country"],
-                    "established_year": school["established_year"]
-                })
-        
-        return {
-            "schools": public_schools[:limit],
-            "total": len(public_schools)
-        }
+        payload = public_schools_payload(limit, school_system.public_schools_version)
+        return Response(content=payload, media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -572,21 +710,7 @@ async def get_public_schools(limit: int = 50):
 @app.get("/api/ai/status")
 async def get_ai_status():
     """Get AI model status"""
-    return {
-        "models": {
-            "gemini": "available" if os.getenv("GEMINI_API_KEY") else "unavailable",
-            "huggingface": "available",
-            "free": "available",
-            "grok": "available" if os.getenv("GROK_API_KEY") else "unavailable"
-        },
-        "default_model": DEFAULT_AI_MODEL,
-        "status": "operational",
-        "features": {
-            "multi_tenant": True,
-            "school_isolation": True,
-            "grade_level_support": True
-        }
-    }
+    return Response(content=AI_STATUS_PAYLOAD, media_type="application/json")
 
 # Startup event
 @app.on_event("startup")
@@ -604,12 +728,19 @@ async def startup_event():
     
     # Start background tasks
     asyncio.create_task(collect_metrics_periodically())
+    
+    global analytics_flush_task
+    analytics_flush_task = asyncio.create_task(flush_analytics_periodically())
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
     """Shutdown event handler"""
     print("🛑 School backend shutting down...")
+    if analytics_flush_task:
+        analytics_flush_task.cancel()
+    await flush_analytics_queue()
+    HASH_POOL.shutdown(wait=False)
 
 if __name__ == "__main__":
     # Production server configuration
@@ -620,5 +751,5 @@ if __name__ == "__main__":
         workers=int(os.getenv("WORKERS", 1)),
         log_level=os.getenv("LOG_LEVEL", "info").lower(),
         access_log=True,
-        reload=os.getenv("DEBUG", "False").lower() == "true"
+        reload=DEBUG_MODE
     )
@@ -5,14 +5,33 @@ Advanced features for school administration, student management, and analytics
 """
 
 from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel, validator
+from pydantic import BaseModel, ConfigDict, TypeAdapter, ValidationError, validator
 from typing import Optional, List, Dict, Any
 import json
 import os
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from enum import Enum
-import uuid
+import itertools
+import secrets
+import heapq
+import atexit
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from operator import attrgetter
+
+# Notification logs are handed to a background listener so the write path never blocks on stdio
+log_queue = queue.SimpleQueue()
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+logger.addHandler(QueueHandler(log_queue))
+logger.propagate = False
+log_listener = QueueListener(log_queue, logging.StreamHandler())
+log_listener.start()
+atexit.register(log_listener.stop)
 
 # Additional enums for realistic features
 class AttendanceStatus(str, Enum):
@@ -76,6 +95,8 @@ class ClassSection(BaseModel):
     room_number: Optional[str] = None
 
 class AttendanceRecord(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     student_id: str
     class_section_id: str
     date: str
@@ -83,6 +104,8 @@ class AttendanceRecord(BaseModel):
     notes: Optional[str] = None
 
 class GradeRecord(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="forbid")
+    
     student_id: str
     quiz_id: str
     score: float
@@ -115,6 +138,44 @@ class SchoolAnnouncement(BaseModel):
     target_groups: List[str]  # all, teachers, students, parents, specific_grade
     expires_at: Optional[str] = None
 
+# Stored rows: HTTP I/O stays on the pydantic models above, storage uses slotted dataclasses
+@dataclass(slots=True)
+class AttendanceRow:
+    """Stored attendance record"""
+    id: str
+    student_id: str
+    class_section_id: str
+    date: str
+    status: AttendanceStatus
+    notes: Optional[str]
+    recorded_at: str
+
+@dataclass(slots=True)
+class GradeRow:
+    """Stored quiz grade"""
+    id: str
+    student_id: str
+    quiz_id: str
+    score: float
+    max_score: float
+    percentage: float
+    attempt_number: int
+    time_taken: int
+    submitted_at: str
+    recorded_at: str
+
+# Validate a whole batch in one compiled call instead of one model per request
+attendance_records_adapter = TypeAdapter(List[AttendanceRecord])
+grade_records_adapter = TypeAdapter(List[GradeRecord])
+
+# Record IDs: a per-process random nonce plus a per-prefix counter, so allocation needs no entropy
+ID_NONCE = secrets.token_hex(3)
+id_counters = defaultdict(itertools.count)
+
+def new_record_id(prefix: str) -> str:
+    """Allocate a unique record ID such as attendance_<nonce><counter>"""
+    return f"{prefix}_{ID_NONCE}{next(id_counters[prefix]):08x}"
+
 # In-memory storage for additional features
 class_sections_db = {}
 attendance_db = {}
@@ -124,6 +185,51 @@ events_db = {}
 announcements_db = {}
 parent_guardians_db = {}
 
+# Secondary indexes so analytics read only matching records
+attendance_by_student_db = {}  # student_id -> list of attendance records
+attendance_by_section_db = {}  # class_section_id -> list of attendance records
+grades_by_student_db = {}  # student_id -> list of grade records
+sections_by_school_db = {}  # school_id -> list of section ids
+active_announcements_db = {}  # school_id -> {announcement_id: announcement} still active
+
+# Min-heap of (expiry epoch seconds, announcement_id); expired entries are popped lazily on read
+announcement_expiry_heap = []
+
+# Running aggregates, updated on write so analytics reads are O(1)
+student_sections_db = {}  # student_id -> set of section ids the student has attendance in
+student_schools_db = {}  # student_id -> set of school ids the student has attendance in
+section_stats_db = {}  # section_id -> running stats
+school_stats_db = {}  # school_id -> running stats
+
+# Dashboards are cached per school and reused until a write bumps the school's version
+school_versions_db = {}  # school_id -> write counter
+dashboard_cache_db = {}  # school_id -> (version, dashboard)
+
+# C-level field projections for the hot per-row loops
+get_percentage = attrgetter("percentage")
+get_status = attrgetter("status")
+
+def new_running_stats() -> Dict[str, Any]:
+    """Create empty running grade/attendance aggregates"""
+    return {
+        "grade_sum": 0.0,
+        "grade_count": 0,
+        "grade_min": None,
+        "grade_max": None,
+        "graded_students": 0,
+        "present": 0,
+        "total_attendance": 0
+    }
+
+def add_grade_to_stats(stats: Dict[str, Any], percentage: float):
+    """Fold one grade percentage into running aggregates"""
+    stats["grade_sum"] += percentage
+    stats["grade_count"] += 1
+    if stats["grade_min"] is None or percentage < stats["grade_min"]:
+        stats["grade_min"] = percentage
+    if stats["grade_max"] is None or percentage > stats["grade_max"]:
+        stats["grade_max"] = percentage
+
 class SchoolFeatures:
     """Advanced school management features"""
     
@@ -135,11 +241,27 @@ class SchoolFeatures:
         self.events = events_db
         self.announcements = announcements_db
         self.parent_guardians = parent_guardians_db
+        self.attendance_by_student = attendance_by_student_db
+        self.attendance_by_section = attendance_by_section_db
+        self.grades_by_student = grades_by_student_db
+        self.sections_by_school = sections_by_school_db
+        self.active_announcements = active_announcements_db
+        self.announcement_expiry_heap = announcement_expiry_heap
+        self.student_sections = student_sections_db
+        self.student_schools = student_schools_db
+        self.section_stats = section_stats_db
+        self.school_stats = school_stats_db
+        self.school_versions = school_versions_db
+        self.dashboard_cache = dashboard_cache_db
+    
+    def _touch_school(self, school_id: str):
+        """Bump a school's version so cached dashboards are rebuilt"""
+        self.school_versions[school_id] = self.school_versions.get(school_id, 0) + 1
     
     def create_class_section(self, school_id: str, section_data: ClassSection, creator_id: str) -> Dict[str, Any]:
         """Create a new class section"""
         try:
-            section_id = f"section_{uuid.uuid4().hex[:8]}"
+            section_id = new_record_id("section")
             
             section = {
                 "id": section_id,
@@ -157,6 +279,8 @@ class SchoolFeatures:
             }
             
             self.class_sections[section_id] = section
+            self.sections_by_school.setdefault(school_id, []).append(section_id)
+            self._touch_school(school_id)
             
             return {
                 "section": section,
@@ -179,7 +303,7 @@ class SchoolFeatures:
                 raise HTTPException(status_code=400, detail="Class section is full")
             
             # Enroll student
-            enrollment_id = f"enrollment_{uuid.uuid4().hex[:8]}"
+            enrollment_id = new_record_id("enrollment")
             enrollment = {
                 "id": enrollment_id,
                 "student_id": student_id,
@@ -190,72 +314,172 @@ class SchoolFeatures:
             
             # Update section count
             section["current_students"] += 1
+            self._touch_school(section["school_id"])
             
             return {
                 "enrollment": enrollment,
                 "message": "Student enrolled in class section successfully"
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to enroll student: {str(e)}")
     
+    def _store_attendance(self, attendance_data: AttendanceRecord, recorded_at: str) -> AttendanceRow:
+        """Store one attendance record and update its indexes and aggregates"""
+        attendance_id = new_record_id("attendance")
+        
+        attendance = AttendanceRow(
+            id=attendance_id,
+            student_id=attendance_data.student_id,
+            class_section_id=attendance_data.class_section_id,
+            date=attendance_data.date,
+            status=attendance_data.status,
+            notes=attendance_data.notes,
+            recorded_at=recorded_at
+        )
+        
+        self.attendance[attendance_id] = attendance
+        self.attendance_by_student.setdefault(attendance.student_id, []).append(attendance)
+        self.attendance_by_section.setdefault(attendance.class_section_id, []).append(attendance)
+        self._update_attendance_stats(attendance)
+        
+        return attendance
+    
     def record_attendance(self, attendance_data: AttendanceRecord) -> Dict[str, Any]:
         """Record student attendance"""
+        attendance = self._store_attendance(attendance_data, datetime.utcnow().isoformat())
+        
+        return {
+            "attendance": attendance,
+            "message": "Attendance recorded successfully"
+        }
+    
+    def bulk_record_attendance(self, records: List[Any]) -> Dict[str, Any]:
+        """Record attendance for many students in one call"""
+        # Accepts raw dicts or AttendanceRecord instances; instances pass through unchanged
         try:
-            attendance_id = f"attendance_{uuid.uuid4().hex[:8]}"
-            
-            attendance = {
-                "id": attendance_id,
-                "student_id": attendance_data.student_id,
-                "class_section_id": attendance_data.class_section_id,
-                "date": attendance_data.date,
-                "status": attendance_data.status,
-                "notes": attendance_data.notes,
-                "recorded_at": datetime.utcnow().isoformat()
-            }
-            
-            self.attendance[attendance_id] = attendance
-            
-            return {
-                "attendance": attendance,
-                "message": "Attendance recorded successfully"
-            }
-            
-        except Exception as e:
+            records = attendance_records_adapter.validate_python(records)
+        except ValidationError as e:
             raise HTTPException(status_code=400, detail=f"Failed to record attendance: {str(e)}")
+        
+        # One timestamp for the whole batch; each row keeps its own attendance date
+        recorded_at = datetime.utcnow().isoformat()
+        attendance = [self._store_attendance(record, recorded_at) for record in records]
+        
+        return {
+            "attendance": attendance,
+            "total": len(attendance),
+            "message": f"{len(attendance)} attendance records recorded successfully"
+        }
+    
+    def _update_attendance_stats(self, attendance: AttendanceRow):
+        """Fold an attendance record into the running section and school aggregates"""
+        student_id = attendance.student_id
+        section_id = attendance.class_section_id
+        is_present = attendance.status is AttendanceStatus.PRESENT
+        student_grades = self.grades_by_student.get(student_id, [])
+        
+        section_stats = self.section_stats.setdefault(section_id, new_running_stats())
+        section_stats["total_attendance"] += 1
+        section_stats["present"] += is_present
+        
+        # A student's grades count toward every section they attend, including earlier grades
+        sections = self.student_sections.setdefault(student_id, set())
+        if section_id not in sections:
+            sections.add(section_id)
+            for percentage in map(get_percentage, student_grades):
+                add_grade_to_stats(section_stats, percentage)
+        
+        section = self.class_sections.get(section_id)
+        if not section:
+            return
+        
+        school_id = section["school_id"]
+        self._touch_school(school_id)
+        school_stats = self.school_stats.setdefault(school_id, new_running_stats())
+        school_stats["total_attendance"] += 1
+        school_stats["present"] += is_present
+        
+        schools = self.student_schools.setdefault(student_id, set())
+        if school_id not in schools:
+            schools.add(school_id)
+            if student_grades:
+                school_stats["graded_students"] += 1
+            for percentage in map(get_percentage, student_grades):
+                add_grade_to_stats(school_stats, percentage)
+    
+    def _update_grade_stats(self, grade: GradeRow):
+        """Fold a grade into the aggregates of every section and school the student attends"""
+        student_id = grade.student_id
+        percentage = grade.percentage
+        
+        for section_id in self.student_sections.get(student_id, ()):
+            add_grade_to_stats(self.section_stats[section_id], percentage)
+        
+        first_grade = len(self.grades_by_student[student_id]) == 1
+        for school_id in self.student_schools.get(student_id, ()):
+            self._touch_school(school_id)
+            school_stats = self.school_stats[school_id]
+            if first_grade:
+                school_stats["graded_students"] += 1
+            add_grade_to_stats(school_stats, percentage)
+    
+    def _store_grade(self, grade_data: GradeRecord, recorded_at: str) -> GradeRow:
+        """Store one grade and update its index and aggregates"""
+        grade_id = new_record_id("grade")
+        
+        grade = GradeRow(
+            id=grade_id,
+            student_id=grade_data.student_id,
+            quiz_id=grade_data.quiz_id,
+            score=grade_data.score,
+            max_score=grade_data.max_score,
+            percentage=grade_data.percentage,
+            attempt_number=grade_data.attempt_number,
+            time_taken=grade_data.time_taken,
+            submitted_at=grade_data.submitted_at,
+            recorded_at=recorded_at
+        )
+        
+        self.grades[grade_id] = grade
+        self.grades_by_student.setdefault(grade.student_id, []).append(grade)
+        self._update_grade_stats(grade)
+        
+        return grade
     
     def record_quiz_grade(self, grade_data: GradeRecord) -> Dict[str, Any]:
         """Record quiz grade for student"""
+        grade = self._store_grade(grade_data, datetime.utcnow().isoformat())
+        
+        return {
+            "grade": grade,
+            "message": "Grade recorded successfully"
+        }
+    
+    def bulk_record_quiz_grades(self, records: List[Any]) -> Dict[str, Any]:
+        """Record quiz grades for many students in one call"""
+        # Accepts raw dicts or GradeRecord instances; instances pass through unchanged
         try:
-            grade_id = f"grade_{uuid.uuid4().hex[:8]}"
-            
-            grade = {
-                "id": grade_id,
-                "student_id": grade_data.student_id,
-                "quiz_id": grade_data.quiz_id,
-                "score": grade_data.score,
-                "max_score": grade_data.max_score,
-                "percentage": grade_data.percentage,
-                "attempt_number": grade_data.attempt_number,
-                "time_taken": grade_data.time_taken,
-                "submitted_at": grade_data.submitted_at,
-                "recorded_at": datetime.utcnow().isoformat()
-            }
-            
-            self.grades[grade_id] = grade
-            
-            return {
-                "grade": grade,
-                "message": "Grade recorded successfully"
-            }
-            
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Failed to record grade: {str(e)}")
+            records = grade_records_adapter.validate_python(records)
+        except ValidationError as e:
+            raise HTTPException(status_code=400, detail=f"Failed to record grades: {str(e)}")
+        
+        # One timestamp for the whole batch; each row keeps its own submitted_at
+        recorded_at = datetime.utcnow().isoformat()
+        grades = [self._store_grade(record, recorded_at) for record in records]
+        
+        return {
+            "grades": grades,
+            "total": len(grades),
+            "message": f"{len(grades)} grades recorded successfully"
+        }
     
     def send_parent_notification(self, notification_data: ParentNotification) -> Dict[str, Any]:
         """Send notification to parent/guardian"""
         try:
-            notification_id = f"notification_{uuid.uuid4().hex[:8]}"
+            notification_id = new_record_id("notification")
             
             notification = {
                 "id": notification_id,
@@ -271,7 +495,7 @@ class SchoolFeatures:
             self.notifications[notification_id] = notification
             
             # In a real system, this would send an actual email/SMS
-            print(f"📧 Notification sent to {notification_data.parent_email}: {notification_data.message}")
+            logger.info("📧 Notification sent to %s: %s", notification_data.parent_email, notification_data.message)
             
             return {
                 "notification": notification,
@@ -284,7 +508,7 @@ class SchoolFeatures:
     def create_school_event(self, school_id: str, event_data: SchoolEvent) -> Dict[str, Any]:
         """Create school event"""
         try:
-            event_id = f"event_{uuid.uuid4().hex[:8]}"
+            event_id = new_record_id("event")
             
             event = {
                 "id": event_id,
@@ -313,7 +537,7 @@ class SchoolFeatures:
     def create_announcement(self, school_id: str, announcement_data: SchoolAnnouncement) -> Dict[str, Any]:
         """Create school announcement"""
         try:
-            announcement_id = f"announcement_{uuid.uuid4().hex[:8]}"
+            announcement_id = new_record_id("announcement")
             
             announcement = {
                 "id": announcement_id,
@@ -327,7 +551,15 @@ class SchoolFeatures:
                 "is_active": True
             }
             
+            # Parse before storing so a bad expiry leaves nothing half-written
+            if announcement["expires_at"]:
+                expires_at = datetime.fromisoformat(announcement["expires_at"])
+                if expires_at.tzinfo is None:
+                    expires_at = expires_at.replace(tzinfo=timezone.utc)
+                heapq.heappush(self.announcement_expiry_heap, (expires_at.timestamp(), announcement_id))
+            
             self.announcements[announcement_id] = announcement
+            self.active_announcements.setdefault(school_id, {})[announcement_id] = announcement
             
             return {
                 "announcement": announcement,
@@ -337,49 +569,75 @@ class SchoolFeatures:
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to create announcement: {str(e)}")
     
+    def _sweep_expired_announcements(self):
+        """Deactivate announcements whose expiry has passed"""
+        heap = self.announcement_expiry_heap
+        now = time.time()
+        while heap and heap[0][0] <= now:
+            _, announcement_id = heapq.heappop(heap)
+            announcement = self.announcements[announcement_id]
+            announcement["is_active"] = False
+            self.active_announcements[announcement["school_id"]].pop(announcement_id, None)
+    
+    def get_active_announcements(self, school_id: str) -> Dict[str, Any]:
+        """Get a school's announcements that have not expired"""
+        self._sweep_expired_announcements()
+        announcements = list(self.active_announcements.get(school_id, {}).values())
+        
+        return {
+            "announcements": announcements,
+            "total": len(announcements)
+        }
+    
     def get_student_progress(self, student_id: str, school_id: str) -> Dict[str, Any]:
         """Get comprehensive student progress report"""
         try:
             # Get all grades for student
-            student_grades = [g for g in self.grades.values() if g["student_id"] == student_id]
+            student_grades = self.grades_by_student.get(student_id, [])
             
             # Get attendance records
-            student_attendance = [a for a in self.attendance.values() if a["student_id"] == student_id]
+            student_attendance = self.attendance_by_student.get(student_id, [])
             
-            # Calculate statistics
+            # Score and subject-wise statistics in a single pass over the grades
             total_quizzes = len(student_grades)
+            score_sum = 0
+            best_score = float("-inf")
+            worst_score = float("inf")
+            subject_totals = defaultdict(lambda: [0, 0])  # subject -> [total, sum]
+            for percentage in map(get_percentage, student_grades):
+                score_sum += percentage
+                if percentage > best_score:
+                    best_score = percentage
+                if percentage < worst_score:
+                    worst_score = percentage
+                
+                # This would need quiz data to get subject, simplified for now
+                subject = "general"  # Would be extracted from quiz data
+                totals = subject_totals[subject]
+                totals[0] += 1
+                totals[1] += percentage
+            
             if total_quizzes > 0:
-                average_score = sum(g["percentage"] for g in student_grades) / total_quizzes
-                best_score = max(g["percentage"] for g in student_grades)
-                worst_score = min(g["percentage"] for g in student_grades)
+                average_score = score_sum / total_quizzes
             else:
                 average_score = 0
                 best_score = 0
                 worst_score = 0
             
-            # Attendance statistics
+            # Attendance statistics in a single pass
             total_attendance = len(student_attendance)
+            status_counts = Counter(map(get_status, student_attendance))
+            
             if total_attendance > 0:
-                present_count = len([a for a in student_attendance if a["status"] == "present"])
-                attendance_percentage = (present_count / total_attendance) * 100
+                attendance_percentage = (status_counts[AttendanceStatus.PRESENT] / total_attendance) * 100
             else:
                 attendance_percentage = 0
             
-            # Subject-wise performance
-            subject_performance = {}
-            for grade in student_grades:
-                # This would need quiz data to get subject, simplified for now
-                subject = "general"  # Would be extracted from quiz data
-                if subject not in subject_performance:
-                    subject_performance[subject] = {"total": 0, "sum": 0}
-                subject_performance[subject]["total"] += 1
-                subject_performance[subject]["sum"] += grade["percentage"]
-            
             # Calculate subject averages
-            for subject in subject_performance:
-                subject_performance[subject]["average"] = (
-                    subject_performance[subject]["sum"] / subject_performance[subject]["total"]
-                )
+            subject_performance = {
+                subject: {"total": total, "sum": score_total, "average": score_total / total}
+                for subject, (total, score_total) in subject_totals.items()
+            }
             
             return {
                 "student_id": student_id,
@@ -394,9 +652,9 @@ class SchoolFeatures:
                 "attendance": {
                     "total_records": total_attendance,
                     "attendance_percentage": round(attendance_percentage, 2),
-                    "present_count": len([a for a in student_attendance if a["status"] == "present"]),
-                    "absent_count": len([a for a in student_attendance if a["status"] == "absent"]),
-                    "late_count": len([a for a in student_attendance if a["status"] == "late"])
+                    "present_count": status_counts[AttendanceStatus.PRESENT],
+                    "absent_count": status_counts[AttendanceStatus.ABSENT],
+                    "late_count": status_counts[AttendanceStatus.LATE]
                 },
                 "generated_at": datetime.utcnow().isoformat()
             }
@@ -411,28 +669,23 @@ class SchoolFeatures:
                 raise HTTPException(status_code=404, detail="Class section not found")
             
             section = self.class_sections[section_id]
-            
-            # Get all students in this section
-            section_students = [s for s in self.grades.values() 
-                              if s["student_id"] in [e["student_id"] for e in self.attendance.values() 
-                                                    if e["class_section_id"] == section_id]]
+            stats = self.section_stats.get(section_id) or new_running_stats()
             
             # Calculate class statistics
-            if section_students:
-                class_average = sum(s["percentage"] for s in section_students) / len(section_students)
-                highest_score = max(s["percentage"] for s in section_students)
-                lowest_score = min(s["percentage"] for s in section_students)
+            grade_count = stats["grade_count"]
+            if grade_count > 0:
+                class_average = stats["grade_sum"] / grade_count
+                highest_score = stats["grade_max"]
+                lowest_score = stats["grade_min"]
             else:
                 class_average = 0
                 highest_score = 0
                 lowest_score = 0
             
             # Attendance for this section
-            section_attendance = [a for a in self.attendance.values() if a["class_section_id"] == section_id]
-            total_attendance_records = len(section_attendance)
+            total_attendance_records = stats["total_attendance"]
             if total_attendance_records > 0:
-                present_count = len([a for a in section_attendance if a["status"] == "present"])
-                class_attendance_percentage = (present_count / total_attendance_records) * 100
+                class_attendance_percentage = (stats["present"] / total_attendance_records) * 100
             else:
                 class_attendance_percentage = 0
             
@@ -445,7 +698,7 @@ class SchoolFeatures:
                     "class_average": round(class_average, 2),
                     "highest_score": round(highest_score, 2),
                     "lowest_score": round(lowest_score, 2),
-                    "total_quizzes_taken": len(section_students)
+                    "total_quizzes_taken": grade_count
                 },
                 "attendance": {
                     "class_attendance_percentage": round(class_attendance_percentage, 2),
@@ -454,56 +707,50 @@ class SchoolFeatures:
                 "generated_at": datetime.utcnow().isoformat()
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to get class analytics: {str(e)}")
     
     def get_school_dashboard(self, school_id: str) -> Dict[str, Any]:
-        """Get comprehensive school dashboard data"""
+        """Get comprehensive school dashboard data (a fresh top-level dict; nested values are shared and read-only)"""
         try:
-            # Get all class sections for this school
-            school_sections = [s for s in self.class_sections.values() if s["school_id"] == school_id]
-            
-            # Get all grades for students in this school
-            school_grades = [g for g in self.grades.values() 
-                           if g["student_id"] in [s["student_id"] for s in self.attendance.values() 
-                                                 if s["class_section_id"] in [sec["id"] for sec in school_sections]]]
+            version = self.school_versions.get(school_id, 0)
+            cached = self.dashboard_cache.get(school_id)
+            if cached and cached[0] == version:
+                return dict(cached[1])
             
-            # Get all attendance records for this school
-            school_attendance = [a for a in self.attendance.values() 
-                               if a["class_section_id"] in [s["id"] for s in school_sections]]
+            # Get all class sections for this school
+            section_ids = self.sections_by_school.get(school_id, [])
+            school_sections = [self.class_sections[section_id] for section_id in section_ids]
+            stats = self.school_stats.get(school_id) or new_running_stats()
             
             # Calculate school-wide statistics
-            total_students = len(set(g["student_id"] for g in school_grades))
-            total_quizzes = len(school_grades)
+            total_students = stats["graded_students"]
+            total_quizzes = stats["grade_count"]
             
             if total_quizzes > 0:
-                school_average = sum(g["percentage"] for g in school_grades) / total_quizzes
+                school_average = stats["grade_sum"] / total_quizzes
             else:
                 school_average = 0
             
             # Attendance statistics
-            if school_attendance:
-                present_count = len([a for a in school_attendance if a["status"] == "present"])
-                school_attendance_percentage = (present_count / len(school_attendance)) * 100
+            if stats["total_attendance"]:
+                school_attendance_percentage = (stats["present"] / stats["total_attendance"]) * 100
             else:
                 school_attendance_percentage = 0
             
             # Subject-wise performance
             subject_stats = {}
-            for grade in school_grades:
+            if total_quizzes > 0:
                 subject = "general"  # Would be extracted from quiz data
-                if subject not in subject_stats:
-                    subject_stats[subject] = {"total": 0, "sum": 0}
-                subject_stats[subject]["total"] += 1
-                subject_stats[subject]["sum"] += grade["percentage"]
+                subject_stats[subject] = {
+                    "total": total_quizzes,
+                    "sum": stats["grade_sum"],
+                    "average": stats["grade_sum"] / total_quizzes
+                }
             
-            # Calculate subject averages
-            for subject in subject_stats:
-                subject_stats[subject]["average"] = (
-                    subject_stats[subject]["sum"] / subject_stats[subject]["total"]
-                )
-            
-            return {
+            dashboard = {
                 "school_id": school_id,
                 "overview": {
                     "total_class_sections": len(school_sections),
@@ -527,6 +774,9 @@ class SchoolFeatures:
                 "generated_at": datetime.utcnow().isoformat()
             }
             
+            self.dashboard_cache[school_id] = (version, dashboard)
+            return dict(dashboard)
+            
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to get school dashboard: {str(e)}")
 
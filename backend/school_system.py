@@ -5,14 +5,19 @@ Implements school registration, student enrollment, and isolated quiz management
 """
 
 from fastapi import FastAPI, HTTPException, Depends
-from pydantic import BaseModel, validator
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, ConfigDict, validator
+from typing import Optional, List, Dict, Any, Iterator, Tuple
 import json
 import os
+import re
 import time
 from datetime import datetime, timedelta
 from enum import Enum
-import uuid
+import itertools
+import secrets
+from collections import defaultdict
+from dataclasses import dataclass
+from types import MappingProxyType
 
 # School-related models
 class SchoolType(str, Enum):
@@ -38,8 +43,79 @@ class EnrollmentStatus(str, Enum):
     GRADUATED = "graduated"
     TRANSFERRED = "transferred"
 
+# Roles are stored and compared as raw strings so lookups never touch Enum members
+STAFF_ROLES = frozenset({UserRole.TEACHER.value, UserRole.SCHOOL_ADMIN.value})
+
+# Per-role permission and default feature templates, shared read-only by every record;
+# replace a record's mapping with a dict copy before changing it
+ADMIN_PERMISSIONS = MappingProxyType({
+    "manage_teachers": True,
+    "manage_students": True,
+    "view_analytics": True,
+    "manage_school_settings": True,
+    "create_quizzes": True
+})
+TEACHER_PERMISSIONS = MappingProxyType({
+    "create_quizzes": True,
+    "view_student_progress": True,
+    "manage_own_quizzes": True,
+    "view_analytics": True
+})
+STUDENT_PERMISSIONS = MappingProxyType({
+    "take_quizzes": True,
+    "view_own_progress": True,
+    "view_school_quizzes": True
+})
+DEFAULT_SCHOOL_FEATURES = MappingProxyType({
+    "ai_quiz_generation": True,
+    "analytics": True,
+    "custom_branding": False,
+    "api_access": False,
+    "priority_support": False
+})
+
+# Validation patterns, compiled once at import instead of on every model instance
+# \A/\Z so a trailing newline cannot slip through; the length cap (RFC 5321) bounds regex backtracking
+EMAIL_RE = re.compile(r'\A[^@\s]+@[^@\s]+\.[^@\s]+\Z')
+EMAIL_MAX_LENGTH = 254
+VALID_GRADES = (
+    "kindergarten", "1st", "2nd", "3rd", "4th", "5th", "6th", "7th", "8th", "9th", "10th", "11th", "12th",
+    "freshman", "sophomore", "junior", "senior", "graduate", "postgraduate"
+)
+VALID_GRADE_SET = frozenset(VALID_GRADES)
+SEARCH_TOKEN_RE = re.compile(r'\w+')
+SEARCH_NGRAM_SIZE = 3
+
+def search_index_keys(token: str) -> set:
+    """Every substring of a token up to SEARCH_NGRAM_SIZE long, for the school search index"""
+    return {token[start:start + size]
+            for size in range(1, SEARCH_NGRAM_SIZE + 1)
+            for start in range(len(token) - size + 1)}
+
+def search_query_keys(token: str) -> set:
+    """Index keys a school must have to contain a query token anywhere in one of its words"""
+    if len(token) <= SEARCH_NGRAM_SIZE:
+        return {token}
+    return {token[start:start + SEARCH_NGRAM_SIZE] for start in range(len(token) - SEARCH_NGRAM_SIZE + 1)}
+
+# Current year for validation, re-read at most once a minute instead of on every registration
+CURRENT_YEAR_REFRESH_SECONDS = 60
+current_year = datetime.now().year
+current_year_checked_at = time.monotonic()
+
+def get_current_year() -> int:
+    """Get the current year, refreshing the cached value when it is stale"""
+    global current_year, current_year_checked_at
+    now = time.monotonic()
+    if now - current_year_checked_at > CURRENT_YEAR_REFRESH_SECONDS:
+        current_year = datetime.now().year
+        current_year_checked_at = now
+    return current_year
+
 # Pydantic models
 class SchoolRegistration(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+    
     school_name: str
     school_type: SchoolType
     address: str
@@ -57,14 +133,13 @@ class SchoolRegistration(BaseModel):
     
     @validator('email')
     def validate_email(cls, v):
-        import re
-        if not re.match(r'^[^@]+@[^@]+\.[^@]+$', v):
+        if len(v) > EMAIL_MAX_LENGTH or not EMAIL_RE.match(v):
             raise ValueError('Invalid email format')
         return v.lower()
     
     @validator('established_year')
     def validate_year(cls, v):
-        current_year = datetime.now().year
+        current_year = get_current_year()
         if v < 1800 or v > current_year:
             raise ValueError(f'Established year must be between 1800 and {current_year}')
         return v
@@ -78,8 +153,7 @@ class SchoolAdminRegistration(BaseModel):
     
     @validator('email')
     def validate_email(cls, v):
-        import re
-        if not re.match(r'^[^@]+@[^@]+\.[^@]+$', v):
+        if len(v) > EMAIL_MAX_LENGTH or not EMAIL_RE.match(v):
             raise ValueError('Invalid email format')
         return v.lower()
 
@@ -112,13 +186,10 @@ class StudentRegistration(BaseModel):
     
     @validator('grade_level')
     def validate_grade(cls, v):
-        valid_grades = [
-            "kindergarten", "1st", "2nd", "3rd", "4th", "5th", "6th", "7th", "8th", "9th", "10th", "11th", "12th",
-            "freshman", "sophomore", "junior", "senior", "graduate", "postgraduate"
-        ]
-        if v.lower() not in valid_grades:
-            raise ValueError(f'Grade level must be one of: {", ".join(valid_grades)}')
-        return v.lower()
+        grade = v.lower()
+        if grade not in VALID_GRADE_SET:
+            raise ValueError(f'Grade level must be one of: {", ".join(VALID_GRADES)}')
+        return grade
 
 class EnrollmentRequest(BaseModel):
     student_id: str
@@ -127,35 +198,95 @@ class EnrollmentRequest(BaseModel):
     parent_email: Optional[str] = None
 
 class SchoolInvitation(BaseModel):
+    model_config = ConfigDict(use_enum_values=True)
+    
     email: str
     role: UserRole
     school_id: str
     message: Optional[str] = None
 
+# Enrollments have one fixed shape and are never mutated in place, so they are stored as slotted rows
+@dataclass(slots=True)
+class EnrollmentRow:
+    """Stored enrollment record"""
+    id: str
+    student_id: str
+    school_id: str
+    grade_level: str
+    enrollment_date: str
+    status: str
+    parent_email: Optional[str]
+
+# Record IDs: a per-process random nonce plus a per-prefix counter, so allocation needs no entropy
+ID_NONCE = secrets.token_hex(3)
+id_counters = defaultdict(itertools.count)
+
+def new_record_id(prefix: str) -> str:
+    """Allocate a unique record ID such as school_<nonce><counter>"""
+    return f"{prefix}_{ID_NONCE}{next(id_counters[prefix]):08x}"
+
 # In-memory storage (replace with database in production)
 schools_db = {}
+public_schools_db = []  # active schools in the public directory shape, maintained on write
 users_db = {}
+users_by_email_db = {}  # email -> user record
+users_by_school_db = {}  # school_id -> set of user ids
+users_by_school_role_db = {}  # (school_id, role) -> set of user ids
+students_by_grade_db = {}  # (school_id, grade_level) -> set of student ids
 enrollments_db = {}
 invitations_db = {}
-school_quizzes_db = {}  # school_id -> quizzes
+school_quizzes_db = {}  # school_id -> {quiz_id: quiz}
+school_public_quizzes_db = {}  # school_id -> {quiz_id: quiz} for public quizzes only
 school_analytics_db = {}
+school_search_text_db = {}  # school_id -> lowercased "name city state"
+school_search_index_db = {}  # substring (up to SEARCH_NGRAM_SIZE) of a name/city/state token -> set of school ids
+
+# School info is cached per school and reused until a write bumps the school's version
+school_versions_db = {}  # school_id -> write counter
+school_info_cache_db = {}  # school_id -> (version, school info)
 
 class SchoolSystem:
     """Multi-tenant school management system"""
     
     def __init__(self):
         self.schools = schools_db
+        self.public_schools = public_schools_db
+        self.public_schools_version = 0  # bumped on every directory change so readers can cache by version
         self.users = users_db
+        self.users_by_email = users_by_email_db
+        self.users_by_school = users_by_school_db
+        self.users_by_school_role = users_by_school_role_db
+        self.students_by_grade = students_by_grade_db
         self.enrollments = enrollments_db
         self.invitations = invitations_db
         self.school_quizzes = school_quizzes_db
+        self.school_public_quizzes = school_public_quizzes_db
         self.analytics = school_analytics_db
+        self.school_search_text = school_search_text_db
+        self.school_search_index = school_search_index_db
+        self.school_versions = school_versions_db
+        self.school_info_cache = school_info_cache_db
+    
+    def _touch_school(self, school_id: str):
+        """Bump a school's version so cached school info is rebuilt"""
+        self.school_versions[school_id] = self.school_versions.get(school_id, 0) + 1
+    
+    def _ensure_emails_available(self, emails: List[str]):
+        """Reject emails already registered or repeated within one request, before anything is written"""
+        seen = set()
+        for email in emails:
+            if email in self.users_by_email or email in seen:
+                raise HTTPException(status_code=400, detail=f"Email already registered: {email}")
+            seen.add(email)
     
     def create_school(self, school_data: SchoolRegistration, admin_data: SchoolAdminRegistration) -> Dict[str, Any]:
         """Create a new school with admin"""
+        self._ensure_emails_available([admin_data.email])
+        
         try:
             # Generate school ID
-            school_id = f"school_{uuid.uuid4().hex[:8]}"
+            school_id = new_record_id("school")
+            now_iso = datetime.utcnow().isoformat()
             
             # Create school
             school = {
@@ -174,42 +305,50 @@ class SchoolSystem:
                 "established_year": school_data.established_year,
                 "max_students": school_data.max_students,
                 "max_teachers": school_data.max_teachers,
-                "created_at": datetime.utcnow().isoformat(),
+                "created_at": now_iso,
                 "is_active": True,
                 "subscription_plan": "basic",  # basic, premium, enterprise
-                "features": {
-                    "ai_quiz_generation": True,
-                    "analytics": True,
-                    "custom_branding": False,
-                    "api_access": False,
-                    "priority_support": False
-                }
+                "features": DEFAULT_SCHOOL_FEATURES
             }
             
             self.schools[school_id] = school
+            self.public_schools.append({
+                "id": school_id,
+                "name": school["name"],
+                "type": school["type"],
+                "city": school["city"],
+                "state": school["state"],
+                "country": school["country"],
+                "established_year": school["established_year"]
+            })
+            self.public_schools_version += 1
+            
+            # Index short substrings of the name/city/state tokens so a query can match anywhere in a word
+            search_text = f"{school['name']} {school['city']} {school['state']}".lower()
+            self.school_search_text[school_id] = search_text
+            for key in set().union(*map(search_index_keys, SEARCH_TOKEN_RE.findall(search_text))):
+                self.school_search_index.setdefault(key, set()).add(school_id)
             
             # Create school admin
-            admin_id = f"admin_{uuid.uuid4().hex[:8]}"
+            admin_id = new_record_id("admin")
             admin = {
                 "id": admin_id,
                 "name": admin_data.name,
                 "email": admin_data.email,
                 "password": admin_data.password,  # Should be hashed
                 "phone": admin_data.phone,
-                "role": UserRole.SCHOOL_ADMIN,
+                "role": UserRole.SCHOOL_ADMIN.value,
                 "school_id": school_id,
-                "created_at": datetime.utcnow().isoformat(),
+                "school_name": school["name"],
+                "created_at": now_iso,
                 "is_active": True,
-                "permissions": {
-                    "manage_teachers": True,
-                    "manage_students": True,
-                    "view_analytics": True,
-                    "manage_school_settings": True,
-                    "create_quizzes": True
-                }
+                "permissions": ADMIN_PERMISSIONS
             }
             
             self.users[admin_id] = admin
+            self.users_by_email[admin["email"]] = admin
+            self.users_by_school[school_id] = {admin_id}
+            self.users_by_school_role[(school_id, admin["role"])] = {admin_id}
             
             # Initialize school analytics
             self.analytics[school_id] = {
@@ -220,11 +359,12 @@ class SchoolSystem:
                 "average_quiz_score": 0.0,
                 "most_popular_subjects": [],
                 "monthly_activity": {},
-                "last_updated": datetime.utcnow().isoformat()
+                "last_updated": now_iso
             }
             
             # Initialize school quizzes
-            self.school_quizzes[school_id] = []
+            self.school_quizzes[school_id] = {}
+            self.school_public_quizzes[school_id] = {}
             
             return {
                 "school": school,
@@ -242,36 +382,38 @@ class SchoolSystem:
         
         # Check if school has capacity
         school = self.schools[school_id]
-        current_teachers = len([u for u in self.users.values() 
-                              if u.get("school_id") == school_id and u.get("role") == UserRole.TEACHER])
+        current_teachers = self.count_school_users(school_id, UserRole.TEACHER.value)
         
         if current_teachers >= school["max_teachers"]:
             raise HTTPException(status_code=400, detail="School has reached maximum teacher capacity")
         
+        self._ensure_emails_available([teacher_data.email])
+        
         # Create teacher
-        teacher_id = f"teacher_{uuid.uuid4().hex[:8]}"
+        teacher_id = new_record_id("teacher")
         teacher = {
             "id": teacher_id,
             "name": teacher_data.name,
             "email": teacher_data.email,
             "password": teacher_data.password,  # Should be hashed
             "phone": teacher_data.phone,
-            "role": UserRole.TEACHER,
+            "role": UserRole.TEACHER.value,
             "school_id": school_id,
+            "school_name": school["name"],
             "subject_specialization": teacher_data.subject_specialization,
             "experience_years": teacher_data.experience_years,
             "qualification": teacher_data.qualification,
             "created_at": datetime.utcnow().isoformat(),
             "is_active": True,
-            "permissions": {
-                "create_quizzes": True,
-                "view_student_progress": True,
-                "manage_own_quizzes": True,
-                "view_analytics": True
-            }
+            "permissions": TEACHER_PERMISSIONS
         }
         
         self.users[teacher_id] = teacher
+        self.users_by_email[teacher["email"]] = teacher
+        self.users_by_school.setdefault(school_id, set()).add(teacher_id)
+        self.users_by_school_role.setdefault((school_id, teacher["role"]), set()).add(teacher_id)
+        
+        self._touch_school(school_id)
         
         # Update school analytics
         if school_id in self.analytics:
@@ -282,58 +424,69 @@ class SchoolSystem:
             "message": "Teacher added to school successfully"
         }
     
-    def enroll_student(self, student_data: StudentRegistration, school_id: str) -> Dict[str, Any]:
-        """Enroll student in school"""
-        if school_id not in self.schools:
-            raise HTTPException(status_code=404, detail="School not found")
-        
-        # Check if school has capacity
-        school = self.schools[school_id]
-        current_students = len([u for u in self.users.values() 
-                              if u.get("school_id") == school_id and u.get("role") == UserRole.STUDENT])
-        
-        if current_students >= school["max_students"]:
-            raise HTTPException(status_code=400, detail="School has reached maximum student capacity")
-        
-        # Create student
-        student_id = f"student_{uuid.uuid4().hex[:8]}"
+    def _build_student_records(self, student_data: StudentRegistration, school: Dict[str, Any], now_iso: str) -> Tuple[Dict[str, Any], EnrollmentRow]:
+        """Build the student and enrollment records for one registration"""
+        school_id = school["id"]
+        student_id = new_record_id("student")
         student = {
             "id": student_id,
             "name": student_data.name,
             "email": student_data.email,
             "password": student_data.password,  # Should be hashed
             "phone": student_data.phone,
-            "role": UserRole.STUDENT,
+            "role": UserRole.STUDENT.value,
             "school_id": school_id,
+            "school_name": school["name"],
             "grade_level": student_data.grade_level,
             "student_id": student_data.student_id,
             "parent_email": student_data.parent_email,
             "date_of_birth": student_data.date_of_birth,
-            "created_at": datetime.utcnow().isoformat(),
+            "created_at": now_iso,
             "is_active": True,
-            "enrollment_status": EnrollmentStatus.ACTIVE,
-            "permissions": {
-                "take_quizzes": True,
-                "view_own_progress": True,
-                "view_school_quizzes": True
-            }
+            "enrollment_status": EnrollmentStatus.ACTIVE.value,
+            "permissions": STUDENT_PERMISSIONS
         }
         
-        self.users[student_id] = student
-        
         # Create enrollment record
-        enrollment_id = f"enrollment_{uuid.uuid4().hex[:8]}"
-        enrollment = {
-            "id": enrollment_id,
-            "student_id": student_id,
-            "school_id": school_id,
-            "grade_level": student_data.grade_level,
-            "enrollment_date": datetime.utcnow().isoformat(),
-            "status": EnrollmentStatus.ACTIVE,
-            "parent_email": student_data.parent_email
-        }
+        enrollment_id = new_record_id("enrollment")
+        enrollment = EnrollmentRow(
+            id=enrollment_id,
+            student_id=student_id,
+            school_id=school_id,
+            grade_level=student_data.grade_level,
+            enrollment_date=now_iso,
+            status=EnrollmentStatus.ACTIVE.value,
+            parent_email=student_data.parent_email
+        )
+        
+        return student, enrollment
+    
+    def enroll_student(self, student_data: StudentRegistration, school_id: str) -> Dict[str, Any]:
+        """Enroll student in school"""
+        if school_id not in self.schools:
+            raise HTTPException(status_code=404, detail="School not found")
+        
+        # Check if school has capacity
+        school = self.schools[school_id]
+        current_students = self.count_school_users(school_id, UserRole.STUDENT.value)
+        
+        if current_students >= school["max_students"]:
+            raise HTTPException(status_code=400, detail="School has reached maximum student capacity")
+        
+        self._ensure_emails_available([student_data.email])
+        
+        # Create student
+        student, enrollment = self._build_student_records(student_data, school, datetime.utcnow().isoformat())
+        student_id = student["id"]
+        
+        self.users[student_id] = student
+        self.users_by_email[student["email"]] = student
+        self.users_by_school.setdefault(school_id, set()).add(student_id)
+        self.users_by_school_role.setdefault((school_id, student["role"]), set()).add(student_id)
+        self.students_by_grade.setdefault((school_id, student["grade_level"]), set()).add(student_id)
+        self.enrollments[enrollment.id] = enrollment
         
-        self.enrollments[enrollment_id] = enrollment
+        self._touch_school(school_id)
         
         # Update school analytics
         if school_id in self.analytics:
@@ -345,8 +498,61 @@ class SchoolSystem:
             "message": "Student enrolled successfully"
         }
     
-    def get_school_quizzes(self, school_id: str, user_role: str, user_id: str) -> List[Dict[str, Any]]:
-        """Get quizzes for a specific school"""
+    def enroll_students_bulk(self, students_data: List[StudentRegistration], school_id: str) -> Dict[str, Any]:
+        """Enroll a batch of students in a school, applying index and analytics updates once"""
+        if school_id not in self.schools:
+            raise HTTPException(status_code=404, detail="School not found")
+        
+        # Check capacity for the whole batch up front so nothing is half-enrolled
+        school = self.schools[school_id]
+        current_students = self.count_school_users(school_id, UserRole.STUDENT.value)
+        
+        if current_students + len(students_data) > school["max_students"]:
+            raise HTTPException(status_code=400, detail="School has reached maximum student capacity")
+        
+        self._ensure_emails_available([student_data.email for student_data in students_data])
+        
+        now_iso = datetime.utcnow().isoformat()
+        students = {}
+        enrollments = {}
+        students_by_grade = {}
+        for student_data in students_data:
+            student, enrollment = self._build_student_records(student_data, school, now_iso)
+            students[student["id"]] = student
+            enrollments[enrollment.id] = enrollment
+            students_by_grade.setdefault(student["grade_level"], []).append(student["id"])
+        
+        self.users.update(students)
+        self.users_by_email.update((student["email"], student) for student in students.values())
+        self.users_by_school.setdefault(school_id, set()).update(students)
+        self.users_by_school_role.setdefault((school_id, UserRole.STUDENT.value), set()).update(students)
+        for grade_level, student_ids in students_by_grade.items():
+            self.students_by_grade.setdefault((school_id, grade_level), set()).update(student_ids)
+        self.enrollments.update(enrollments)
+        
+        self._touch_school(school_id)
+        
+        # Update school analytics
+        if school_id in self.analytics:
+            self.analytics[school_id]["total_students"] += len(students)
+        
+        return {
+            "students": list(students.values()),
+            "enrollments": list(enrollments.values()),
+            "total": len(students),
+            "message": f"{len(students)} students enrolled successfully"
+        }
+    
+    def count_school_users(self, school_id: str, role: str) -> int:
+        """Count users with a role in a school from the per-school role index"""
+        return len(self.users_by_school_role.get((school_id, role), ()))
+    
+    def get_students_by_grade(self, school_id: str, grade_level: str) -> List[Dict[str, Any]]:
+        """Get students of a school in a specific grade level"""
+        return [self.users[student_id] for student_id in self.students_by_grade.get((school_id, grade_level.lower()), ())]
+    
+    def _visible_school_quizzes(self, school_id: str, user_role: str, user_id: str) -> Dict[str, Dict[str, Any]]:
+        """Check access and get the {quiz_id: quiz} map a user may see in a school"""
         if school_id not in self.schools:
             raise HTTPException(status_code=404, detail="School not found")
         
@@ -355,23 +561,30 @@ class SchoolSystem:
         if not user or user.get("school_id") != school_id:
             raise HTTPException(status_code=403, detail="Access denied: User not enrolled in this school")
         
-        # Get school quizzes
-        school_quizzes = self.school_quizzes.get(school_id, [])
-        
         # Filter based on user role
         if user_role == UserRole.STUDENT:
             # Students can only see public quizzes
-            visible_quizzes = [q for q in school_quizzes if q.get("is_public", True)]
+            return self.school_public_quizzes.get(school_id, {})
         elif user_role == UserRole.TEACHER:
             # Teachers can see all quizzes in their school
-            visible_quizzes = school_quizzes
+            return self.school_quizzes.get(school_id, {})
         elif user_role == UserRole.SCHOOL_ADMIN:
             # School admins can see all quizzes
-            visible_quizzes = school_quizzes
+            return self.school_quizzes.get(school_id, {})
         else:
-            visible_quizzes = []
-        
-        return visible_quizzes
+            return {}
+    
+    def get_school_quizzes(self, school_id: str, user_role: str, user_id: str) -> List[Dict[str, Any]]:
+        """Get quizzes for a specific school"""
+        return list(self._visible_school_quizzes(school_id, user_role, user_id).values())
+    
+    def iter_school_quizzes(self, school_id: str, user_role: str, user_id: str,
+                            offset: int = 0, limit: Optional[int] = None) -> Tuple[int, Iterator[Dict[str, Any]]]:
+        """Get the visible quiz count and a lazy iterator over one page of quizzes"""
+        # Access is checked here, before the caller starts consuming the iterator
+        visible_quizzes = self._visible_school_quizzes(school_id, user_role, user_id)
+        stop = None if limit is None else offset + limit
+        return len(visible_quizzes), itertools.islice(visible_quizzes.values(), offset, stop)
     
     def create_school_quiz(self, quiz_data: Dict[str, Any], school_id: str, creator_id: str) -> Dict[str, Any]:
         """Create quiz for specific school"""
@@ -384,11 +597,11 @@ class SchoolSystem:
             raise HTTPException(status_code=403, detail="Access denied: User not enrolled in this school")
         
         # Check if creator can create quizzes
-        if creator.get("role") not in [UserRole.TEACHER, UserRole.SCHOOL_ADMIN]:
+        if creator.get("role") not in STAFF_ROLES:
             raise HTTPException(status_code=403, detail="Access denied: Only teachers and admins can create quizzes")
         
         # Create quiz
-        quiz_id = f"quiz_{uuid.uuid4().hex[:8]}"
+        quiz_id = new_record_id("quiz")
         quiz = {
             "id": quiz_id,
             "title": quiz_data["title"],
@@ -412,10 +625,11 @@ class SchoolSystem:
         }
         
         # Add to school quizzes
-        if school_id not in self.school_quizzes:
-            self.school_quizzes[school_id] = []
+        self.school_quizzes.setdefault(school_id, {})[quiz_id] = quiz
+        if quiz["is_public"]:
+            self.school_public_quizzes.setdefault(school_id, {})[quiz_id] = quiz
         
-        self.school_quizzes[school_id].append(quiz)
+        self._touch_school(school_id)
         
         # Update school analytics
         if school_id in self.analytics:
@@ -436,32 +650,56 @@ class SchoolSystem:
         if not user or user.get("school_id") != school_id:
             raise HTTPException(status_code=403, detail="Access denied: User not enrolled in this school")
         
-        if user.get("role") not in [UserRole.TEACHER, UserRole.SCHOOL_ADMIN]:
+        if user.get("role") not in STAFF_ROLES:
             raise HTTPException(status_code=403, detail="Access denied: Only teachers and admins can view analytics")
         
         return self.analytics.get(school_id, {})
     
     def get_school_info(self, school_id: str) -> Dict[str, Any]:
-        """Get school information"""
+        """Get school information (a fresh top-level dict; nested values are shared and read-only)"""
         if school_id not in self.schools:
             raise HTTPException(status_code=404, detail="School not found")
         
-        school = self.schools[school_id].copy()
-        
-        # Add current statistics
-        school["current_students"] = len([u for u in self.users.values() 
-                                        if u.get("school_id") == school_id and u.get("role") == UserRole.STUDENT])
-        school["current_teachers"] = len([u for u in self.users.values() 
-                                        if u.get("school_id") == school_id and u.get("role") == UserRole.TEACHER])
-        school["total_quizzes"] = len(self.school_quizzes.get(school_id, []))
+        version = self.school_versions.get(school_id, 0)
+        cached = self.school_info_cache.get(school_id)
+        if cached and cached[0] == version:
+            return dict(cached[1])
+        
+        # Build the response and current statistics in one dict instead of copying then growing it
+        school_info = {
+            **self.schools[school_id],
+            "current_students": self.count_school_users(school_id, UserRole.STUDENT.value),
+            "current_teachers": self.count_school_users(school_id, UserRole.TEACHER.value),
+            "total_quizzes": len(self.school_quizzes.get(school_id, {}))
+        }
         
-        return school
+        self.school_info_cache[school_id] = (version, school_info)
+        return dict(school_info)
     
     def search_schools(self, query: str, school_type: Optional[SchoolType] = None) -> List[Dict[str, Any]]:
         """Search for schools"""
-        results = []
+        query = query.lower()
+        
+        # Every word-character run in the query sits inside some indexed word, so a matching school has all
+        # of the run's n-grams; intersect their posting sets (smallest first) and confirm with a substring check
+        keys = set()
+        for token in SEARCH_TOKEN_RE.findall(query):
+            keys |= search_query_keys(token)
+        
+        if keys:
+            postings = sorted((self.school_search_index.get(key, set()) for key in keys), key=len)
+            candidates = postings[0].intersection(*postings[1:])
+            if not candidates:
+                return []
+            # IDs come from an ordered counter, so sorting keeps creation order
+            school_ids = sorted(candidates)
+        else:
+            # No word characters to look up (e.g. a lone space); only the full scan can answer
+            school_ids = self.schools
         
-        for school in self.schools.values():
+        results = []
+        for school_id in school_ids:
+            school = self.schools[school_id]
             if not school.get("is_active", True):
                 continue
             
@@ -470,8 +708,7 @@ class SchoolSystem:
                 continue
             
             # Search in name, city, state
-            search_text = f"{school.get('name', '')} {school.get('city', '')} {school.get('state', '')}".lower()
-            if query.lower() in search_text:
+            if query in self.school_search_text[school_id]:
                 # Return limited info for search results
                 results.append({
                     "id": school["id"],
@@ -481,8 +718,7 @@ class SchoolSystem:
                     "state": school["state"],
                     "country": school["country"],
                     "established_year": school["established_year"],
-                    "current_students": len([u for u in self.users.values() 
-                                            if u.get("school_id") == school["id"] and u.get("role") == UserRole.STUDENT])
+                    "current_students": self.count_school_users(school["id"], UserRole.STUDENT.value)
                 })
         
         return results
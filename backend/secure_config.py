@@ -3,19 +3,25 @@ import os
 from dotenv import load_dotenv
 import secrets
 import hashlib
+import hmac
 from typing import Optional
+from passlib.context import CryptContext
 
 # Load environment variables
 load_dotenv()
 
+# Password hashing context, built once and shared by every hash/verify call
+# Honors BCRYPT_ROUNDS like security.pwd_context so both contexts hash at the same cost
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=int(os.getenv('BCRYPT_ROUNDS', '12')))
+
 class SecureConfig:
     """Secure configuration management for the quiz system"""
     
     def __init__(self):
-        self._validate_environment()
+        self._load_environment()
     
-    def _validate_environment(self):
-        """Validate that all required environment variables are set"""
+    def _load_environment(self):
+        """Validate required environment variables and read all settings once"""
         required_vars = [
             'SUPER_ADMIN_EMAIL',
             'SUPER_ADMIN_PASSWORD',
@@ -30,51 +36,59 @@ class SecureConfig:
         
         if missing_vars:
             raise ValueError(f"Missing required environment variables: {', '.join(missing_vars)}")
+        
+        self._super_admin_email = os.getenv('SUPER_ADMIN_EMAIL')
+        self._super_admin_password = os.getenv('SUPER_ADMIN_PASSWORD')
+        self._secret_key = os.getenv('SECRET_KEY')
+        self._database_url = os.getenv('DATABASE_URL')
+        self._jwt_algorithm = os.getenv('JWT_ALGORITHM', 'HS256')
+        self._jwt_expiration_hours = int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
     
     @property
     def super_admin_email(self) -> str:
         """Get super admin email from environment"""
-        return os.getenv('SUPER_ADMIN_EMAIL')
+        return self._super_admin_email
     
     @property
     def super_admin_password(self) -> str:
         """Get super admin password from environment"""
-        return os.getenv('SUPER_ADMIN_PASSWORD')
+        return self._super_admin_password
     
     @property
     def secret_key(self) -> str:
         """Get secret key for JWT tokens"""
-        return os.getenv('SECRET_KEY')
+        return self._secret_key
     
     @property
     def database_url(self) -> str:
         """Get database URL"""
-        return os.getenv('DATABASE_URL')
+        return self._database_url
     
     @property
     def jwt_algorithm(self) -> str:
         """Get JWT algorithm"""
-        return os.getenv('JWT_ALGORITHM', 'HS256')
+        return self._jwt_algorithm
     
     @property
     def jwt_expiration_hours(self) -> int:
         """Get JWT expiration time in hours"""
-        return int(os.getenv('JWT_EXPIRATION_HOURS', '24'))
+        return self._jwt_expiration_hours
     
     @staticmethod
     def hash_password(password: str) -> str:
-        """Hash password using SHA-256 with salt"""
-        salt = secrets.token_hex(16)
-        password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-        return f"{salt}:{password_hash}"
+        """Hash password using bcrypt"""
+        return pwd_context.hash(password)
     
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
         """Verify password against hash"""
         try:
-            salt, stored_hash = hashed_password.split(':')
-            password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-            return password_hash == stored_hash
+            if ':' in hashed_password:
+                # Legacy salted SHA-256 hashes stored as "salt:hexdigest"
+                salt, stored_hash = hashed_password.split(':')
+                password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+                return hmac.compare_digest(password_hash, stored_hash)
+            return pwd_context.verify(password, hashed_password)
         except ValueError:
             return False
     
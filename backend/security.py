@@ -5,10 +5,14 @@ Implements JWT authentication, input validation, and security best practices
 """
 
 import os
+import time
 import hashlib
 import secrets
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import string
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Dict, Any, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
@@ -17,17 +21,53 @@ from pydantic import BaseModel, validator
 import re
 
 # Security configuration
-SECRET_KEY = os.getenv('SECRET_KEY', secrets.token_urlsafe(32))
+SECRET_KEY = os.getenv('SECRET_KEY')
+if not SECRET_KEY:
+    # A per-process random key cannot validate tokens across workers or restarts
+    if os.getenv('ENVIRONMENT') == 'production':
+        raise ValueError("Missing required environment variable: SECRET_KEY")
+    SECRET_KEY = secrets.token_urlsafe(32)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# Input sanitization patterns, compiled once at import
+HTML_TAG_RE = re.compile(r'<[^>]+>')
+DANGEROUS_CHARS_TABLE = str.maketrans('', '', '<>"\'')
+UNSAFE_FILENAME_CHARS_RE = re.compile(r'[^a-zA-Z0-9._-]')
+
+# Password strength character classes and patterns
+UPPERCASE_CHARS = frozenset(string.ascii_uppercase)
+LOWERCASE_CHARS = frozenset(string.ascii_lowercase)
+SPECIAL_CHARS = frozenset('!@#$%^&*(),.?":{}|<>')
+REPEATED_CHAR_RE = re.compile(r'(.)\1{2,}')
+COMMON_SEQUENCE_RE = re.compile(r'(123|abc|qwe)')
+
+# Identifier hashing for logs (set LOG_HASH_SHA256=1 where only FIPS digests are allowed)
+LOG_HASH_USE_SHA256 = os.getenv('LOG_HASH_SHA256', '0') == '1'
+
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', '12'))
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# Short-lived cache of successful password checks (opt-in, keys derive from the plaintext)
+PASSWORD_VERIFY_CACHE_ENABLED = os.getenv('BCRYPT_VERIFY_CACHE', '0') == '1'
+PASSWORD_VERIFY_CACHE_TTL = 60  # seconds
+PASSWORD_VERIFY_CACHE_MAX_SIZE = 10000
+# The cache lives in the calling process: code that verifies in a process pool must check and
+# fill it around the pool call (see school_backend login), since each worker has its own copy
+password_verify_cache = {}  # sha256(plain|hash) -> cached_until (monotonic)
+password_verify_cache_lock = threading.Lock()
 
 # JWT token scheme
 security = HTTPBearer()
 
+# Decoded token payloads, so a burst of requests with one token verifies the signature once
+TOKEN_CACHE_TTL = 60  # seconds
+TOKEN_CACHE_MAX_SIZE = 10000
+token_cache = OrderedDict()  # blake2b(token) -> (cached_until, payload), LRU order
+token_cache_lock = threading.Lock()  # sync dependencies run verify_token on FastAPI's threadpool
+
 class SecurityConfig:
     """Security configuration class"""
     
@@ -48,41 +88,100 @@ class SecurityConfig:
     MAX_LOGIN_ATTEMPTS = 5
     LOCKOUT_DURATION_MINUTES = 15
 
+def _password_cache_key(plain_password: str, hashed_password: str) -> bytes:
+    """Cache key for a password/hash pair"""
+    return hashlib.sha256(f"{plain_password}|{hashed_password}".encode()).digest()
+
+def is_password_verify_cached(plain_password: str, hashed_password: str) -> bool:
+    """Whether this pair verified successfully within the cache TTL (always False when disabled)"""
+    if not PASSWORD_VERIFY_CACHE_ENABLED:
+        return False
+    with password_verify_cache_lock:
+        return password_verify_cache.get(_password_cache_key(plain_password, hashed_password), 0) > time.monotonic()
+
+def remember_verified_password(plain_password: str, hashed_password: str) -> None:
+    """Record a successful verification (no-op when the cache is disabled)"""
+    if not PASSWORD_VERIFY_CACHE_ENABLED:
+        return
+    key = _password_cache_key(plain_password, hashed_password)
+    now = time.monotonic()
+    with password_verify_cache_lock:
+        if len(password_verify_cache) >= PASSWORD_VERIFY_CACHE_MAX_SIZE:
+            for stale_key in [k for k, until in password_verify_cache.items() if until <= now]:
+                del password_verify_cache[stale_key]
+            if len(password_verify_cache) >= PASSWORD_VERIFY_CACHE_MAX_SIZE:
+                password_verify_cache.clear()
+        password_verify_cache[key] = now + PASSWORD_VERIFY_CACHE_TTL
+
+def verify_password_hash(plain_password: str, hashed_password: str) -> bool:
+    """Run the bcrypt check without the verify cache (for worker processes)"""
+    return pwd_context.verify(plain_password, hashed_password)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    if is_password_verify_cached(plain_password, hashed_password):
+        return True
+    
+    if not pwd_context.verify(plain_password, hashed_password):
+        return False
+    
+    remember_verified_password(plain_password, hashed_password)
+    return True
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
     return pwd_context.hash(password)
 
+def _password_char_classes(password: str) -> Tuple[bool, bool, bool, bool]:
+    """Scan a password once for uppercase, lowercase, digit and special characters"""
+    has_upper = has_lower = has_digit = has_special = False
+    for ch in password:
+        if ch in UPPERCASE_CHARS:
+            has_upper = True
+        elif ch in LOWERCASE_CHARS:
+            has_lower = True
+        elif ch.isdecimal():
+            has_digit = True
+        elif ch in SPECIAL_CHARS:
+            has_special = True
+        else:
+            continue
+        if has_upper and has_lower and has_digit and has_special:
+            break
+    return has_upper, has_lower, has_digit, has_special
+
 def validate_password_strength(password: str) -> Dict[str, Any]:
     """Validate password strength"""
     errors = []
+    has_upper, has_lower, has_digit, has_special = classes = _password_char_classes(password)
     
     if len(password) < SecurityConfig.MIN_PASSWORD_LENGTH:
         errors.append(f"Password must be at least {SecurityConfig.MIN_PASSWORD_LENGTH} characters long")
     
-    if SecurityConfig.REQUIRE_UPPERCASE and not re.search(r'[A-Z]', password):
+    if SecurityConfig.REQUIRE_UPPERCASE and not has_upper:
         errors.append("Password must contain at least one uppercase letter")
     
-    if SecurityConfig.REQUIRE_LOWERCASE and not re.search(r'[a-z]', password):
+    if SecurityConfig.REQUIRE_LOWERCASE and not has_lower:
         errors.append("Password must contain at least one lowercase letter")
     
-    if SecurityConfig.REQUIRE_NUMBERS and not re.search(r'\d', password):
+    if SecurityConfig.REQUIRE_NUMBERS and not has_digit:
         errors.append("Password must contain at least one number")
     
-    if SecurityConfig.REQUIRE_SPECIAL_CHARS and not re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
+    if SecurityConfig.REQUIRE_SPECIAL_CHARS and not has_special:
         errors.append("Password must contain at least one special character")
     
     return {
         "is_valid": len(errors) == 0,
         "errors": errors,
-        "strength": calculate_password_strength(password)
+        "strength": _score_password_strength(password, classes)
     }
 
 def calculate_password_strength(password: str) -> str:
     """Calculate password strength"""
+    return _score_password_strength(password, _password_char_classes(password))
+
+def _score_password_strength(password: str, classes: Tuple[bool, bool, bool, bool]) -> str:
+    """Score a password from its length, character classes and common patterns"""
     score = 0
     
     # Length
@@ -92,19 +191,12 @@ def calculate_password_strength(password: str) -> str:
         score += 1
     
     # Character variety
-    if re.search(r'[a-z]', password):
-        score += 1
-    if re.search(r'[A-Z]', password):
-        score += 1
-    if re.search(r'\d', password):
-        score += 1
-    if re.search(r'[!@#$%^&*(),.?":{}|<>]', password):
-        score += 1
+    score += sum(classes)
     
     # Common patterns (penalties)
-    if re.search(r'(.)\1{2,}', password):  # Repeated characters
+    if REPEATED_CHAR_RE.search(password):  # Repeated characters
         score -= 1
-    if re.search(r'(123|abc|qwe)', password.lower()):  # Common sequences
+    if COMMON_SEQUENCE_RE.search(password.lower()):  # Common sequences
         score -= 1
     
     if score <= 2:
@@ -116,51 +208,77 @@ def calculate_password_strength(password: str) -> str:
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
-    to_encode = data.copy()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + ACCESS_TOKEN_EXPIRE_MINUTES * 60
     
-    to_encode.update({"exp": expire, "type": "access"})
+    to_encode = {**data, "exp": expire, "type": "access"}
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 def create_refresh_token(data: dict):
     """Create JWT refresh token"""
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
-    to_encode.update({"exp": expire, "type": "refresh"})
+    expire = int(time.time()) + REFRESH_TOKEN_EXPIRE_DAYS * 86400
+    to_encode = {**data, "exp": expire, "type": "refresh"}
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _token_cache_key(token: str) -> bytes:
+    """Fixed-size cache key so raw bearer tokens are not held as dict keys"""
+    return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+def invalidate_cached_token(token: str) -> None:
+    """Drop a token's cached payload, e.g. on logout"""
+    with token_cache_lock:
+        token_cache.pop(_token_cache_key(token), None)
+
 def verify_token(token: str, token_type: str = "access") -> Dict[str, Any]:
     """Verify JWT token"""
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        
-        # Check token type
-        if payload.get("type") != token_type:
+    key = _token_cache_key(token)
+    payload = None
+    with token_cache_lock:
+        cached = token_cache.get(key)
+        if cached and cached[0] > time.time():
+            payload = cached[1]
+            token_cache.move_to_end(key)
+    
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token type"
+                detail="Could not validate credentials"
             )
         
-        # Check expiration
+        # Never keep a decoded payload past the token's own expiry
+        cached_until = time.time() + TOKEN_CACHE_TTL
         exp = payload.get("exp")
-        if exp is None or datetime.utcnow() > datetime.fromtimestamp(exp):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Token has expired"
-            )
-        
-        return payload
-        
-    except JWTError:
+        if isinstance(exp, (int, float)):
+            cached_until = min(cached_until, exp)
+        with token_cache_lock:
+            token_cache[key] = (cached_until, payload)
+            token_cache.move_to_end(key)
+            if len(token_cache) > TOKEN_CACHE_MAX_SIZE:
+                token_cache.popitem(last=False)
+    
+    # Check token type
+    if payload.get("type") != token_type:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials"
+            detail="Invalid token type"
         )
+    
+    # Check expiration (still checked on cache hits)
+    exp = payload.get("exp")
+    if exp is None or exp < time.time():
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has expired"
+        )
+    
+    return payload
 
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> Dict[str, Any]:
     """Get current user from JWT token"""
@@ -194,8 +312,11 @@ def require_role(required_role: str):
 
 def require_roles(required_roles: list):
     """Decorator to require one of multiple user roles"""
+    # Normalize Enum members to raw strings once so each request is a single set lookup
+    allowed_roles = frozenset(getattr(role, "value", role) for role in required_roles)
+    
     def role_checker(current_user: Dict[str, Any] = Depends(get_current_user)):
-        if current_user.get("role") not in required_roles:
+        if current_user.get("role") not in allowed_roles:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail=f"Access denied. Required roles: {', '.join(required_roles)}"
@@ -209,10 +330,10 @@ def sanitize_input(text: str, max_length: int = SecurityConfig.MAX_STRING_LENGTH
         return ""
     
     # Remove HTML tags
-    text = re.sub(r'<[^>]+>', '', text)
+    text = HTML_TAG_RE.sub('', text)
     
     # Remove potentially dangerous characters
-    text = re.sub(r'[<>"\']', '', text)
+    text = text.translate(DANGEROUS_CHARS_TABLE)
     
     # Limit length
     if len(text) > max_length:
@@ -220,6 +341,13 @@ def sanitize_input(text: str, max_length: int = SecurityConfig.MAX_STRING_LENGTH
     
     return text.strip()
 
+VALID_QUIZ_SUBJECTS = ("python", "mathematics", "english", "science", "history", "geography", "physics", "chemistry", "biology")
+VALID_QUIZ_SUBJECT_SET = frozenset(VALID_QUIZ_SUBJECTS)
+VALID_QUIZ_SUBJECTS_TEXT = ", ".join(VALID_QUIZ_SUBJECTS)
+VALID_QUIZ_DIFFICULTIES = ("easy", "medium", "hard")
+VALID_QUIZ_DIFFICULTY_SET = frozenset(VALID_QUIZ_DIFFICULTIES)
+VALID_QUIZ_DIFFICULTIES_TEXT = ", ".join(VALID_QUIZ_DIFFICULTIES)
+
 def validate_quiz_data(quiz_data: Dict[str, Any]) -> Dict[str, Any]:
     """Validate quiz creation data"""
     errors = []
@@ -245,15 +373,13 @@ def validate_quiz_data(quiz_data: Dict[str, Any]) -> Dict[str, Any]:
     
     # Subject validation
     subject = quiz_data.get("subject", "")
-    valid_subjects = ["python", "mathematics", "english", "science", "history", "geography", "physics", "chemistry", "biology"]
-    if subject not in valid_subjects:
-        errors.append(f"Subject must be one of: {', '.join(valid_subjects)}")
+    if not isinstance(subject, str) or subject not in VALID_QUIZ_SUBJECT_SET:
+        errors.append(f"Subject must be one of: {VALID_QUIZ_SUBJECTS_TEXT}")
     
     # Difficulty validation
     difficulty = quiz_data.get("difficulty", "")
-    valid_difficulties = ["easy", "medium", "hard"]
-    if difficulty not in valid_difficulties:
-        errors.append(f"Difficulty must be one of: {', '.join(valid_difficulties)}")
+    if not isinstance(difficulty, str) or difficulty not in VALID_QUIZ_DIFFICULTY_SET:
+        errors.append(f"Difficulty must be one of: {VALID_QUIZ_DIFFICULTIES_TEXT}")
     
     return {
         "is_valid": len(errors) == 0,
@@ -273,27 +399,42 @@ def generate_secure_filename(original_filename: str) -> str:
     filename = os.path.basename(original_filename)
     
     # Remove dangerous characters
-    filename = re.sub(r'[^a-zA-Z0-9._-]', '_', filename)
+    filename = UNSAFE_FILENAME_CHARS_RE.sub('_', filename)
     
-    # Add timestamp and random string
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    random_string = secrets.token_hex(8)
+    # Add UTC timestamp and random string
+    timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime())
+    random_string = os.urandom(8).hex()
     name, ext = os.path.splitext(filename)
     
     return f"{name}_{timestamp}_{random_string}{ext}"
 
 def hash_sensitive_data(data: str) -> str:
     """Hash sensitive data for logging"""
-    return hashlib.sha256(data.encode()).hexdigest()[:16]
+    if LOG_HASH_USE_SHA256:
+        return hashlib.sha256(data.encode()).hexdigest()[:16]
+    return hashlib.blake2b(data.encode(), digest_size=8).hexdigest()
 
 # Security headers middleware
+SECURITY_HEADERS = (
+    ("X-Content-Type-Options", "nosniff"),
+    ("X-Frame-Options", "DENY"),
+    ("X-XSS-Protection", "1; mode=block"),
+    ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+    ("Referrer-Policy", "strict-origin-when-cross-origin"),
+)
+SECURITY_HEADERS_RAW = [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in SECURITY_HEADERS]
+SECURITY_HEADER_NAMES_RAW = frozenset(name for name, _ in SECURITY_HEADERS_RAW)
+
 def add_security_headers(response):
     """Add security headers to response"""
-    response.headers["X-Content-Type-Options"] = "nosniff"
-    response.headers["X-Frame-Options"] = "DENY"
-    response.headers["X-XSS-Protection"] = "1; mode=block"
-    response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-    response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
+    headers = response.headers
+    raw = getattr(headers, "raw", None)
+    # Append in one go unless a handler already set one of them (then replace per key)
+    if isinstance(raw, list) and not any(name in SECURITY_HEADER_NAMES_RAW for name, _ in raw):
+        raw.extend(SECURITY_HEADERS_RAW)
+    else:
+        for name, value in SECURITY_HEADERS:
+            headers[name] = value
     return response
 
 if __name__ == "__main__":
@@ -1,10 +1,14 @@
 import os
+import atexit
 import logging
-from typing import List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
 from twilio.rest import Client
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect, or_, and_
+from sqlalchemy.orm import Session, joinedload
 from models import User, Notification, QuizResult, Quiz
 from schemas import NotificationCreate
 from dotenv import load_dotenv
@@ -13,6 +17,124 @@ load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Outgoing email calls run on this pool so request handlers don't wait on provider round trips
+NOTIFICATION_SEND_WORKERS = int(os.getenv("NOTIFICATION_SEND_WORKERS", "4"))
+send_executor = ThreadPoolExecutor(max_workers=NOTIFICATION_SEND_WORKERS, thread_name_prefix="notification-send")
+atexit.register(send_executor.shutdown)
+
+# SendGrid accepts at most 1000 personalizations per request
+SENDGRID_MAX_PERSONALIZATIONS = 1000
+FULL_NAME_TAG = "-full_name-"
+
+# Email bodies, parsed once at import and filled in with Template.substitute
+COMPLETED_EMAIL_TEXT = Template("""
+            Hello $full_name,
+            
+            You have successfully completed the quiz: $quiz_title
+            
+            Your Results:
+            - Score: $total_score/$max_score
+            - Percentage: $percentage%
+            - Time Taken: $minutes_taken minutes
+            
+            Thank you for taking the quiz!
+            """)
+
+COMPLETED_EMAIL_HTML = Template("""
+            <html>
+            <body>
+                <h2>Quiz Completed Successfully!</h2>
+                <p>Hello $full_name,</p>
+                <p>You have successfully completed the quiz: <strong>$quiz_title</strong></p>
+                
+                <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3>Your Results:</h3>
+                    <ul>
+                        <li><strong>Score:</strong> $total_score/$max_score</li>
+                        <li><strong>Percentage:</strong> $percentage%</li>
+                        <li><strong>Time Taken:</strong> $minutes_taken minutes</li>
+                    </ul>
+                </div>
+                
+                <p>Thank you for taking the quiz!</p>
+            </body>
+            </html>
+            """)
+
+ASSIGNED_EMAIL_TEXT = Template("""
+            Hello $full_name,
+            
+            A new quiz has been assigned to you:
+            
+            Quiz: $quiz_title
+            Description: $description
+            Time Limit: $time_limit minutes
+            Questions: $total_questions
+            
+            Please log in to your account to take the quiz.
+            """)
+
+ASSIGNED_EMAIL_HTML = Template("""
+            <html>
+            <body>
+                <h2>New Quiz Assigned!</h2>
+                <p>Hello $full_name,</p>
+                <p>A new quiz has been assigned to you:</p>
+                
+                <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3>$quiz_title</h3>
+                    <p><strong>Description:</strong> $description</p>
+                    <p><strong>Time Limit:</strong> $time_limit minutes</p>
+                    <p><strong>Questions:</strong> $total_questions</p>
+                </div>
+                
+                <p>Please log in to your account to take the quiz.</p>
+            </body>
+            </html>
+            """)
+
+APPROVED_EMAIL_TEXT = Template("""
+            Hello $full_name,
+            
+            Your quiz has been approved and is now available to students:
+            
+            Quiz: $quiz_title
+            Description: $description
+            Questions: $total_questions
+            
+            Students can now access and take this quiz.
+            """)
+
+APPROVED_EMAIL_HTML = Template("""
+            <html>
+            <body>
+                <h2>Quiz Approved!</h2>
+                <p>Hello $full_name,</p>
+                <p>Your quiz has been approved and is now available to students:</p>
+                
+                <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
+                    <h3>$quiz_title</h3>
+                    <p><strong>Description:</strong> $description</p>
+                    <p><strong>Questions:</strong> $total_questions</p>
+                </div>
+                
+                <p>Students can now access and take this quiz.</p>
+            </body>
+            </html>
+            """)
+
+def build_mail_request_body(from_email: str, personalizations: List[Dict[str, Any]], subject: str, content: str, html_content: str = None) -> Dict[str, Any]:
+    """Build a SendGrid v3 mail/send payload directly, without the Mail helper objects."""
+    body_content = [{"type": "text/plain", "value": content}]
+    if html_content:
+        body_content.append({"type": "text/html", "value": html_content})
+    return {
+        "personalizations": personalizations,
+        "from": {"email": from_email},
+        "subject": subject,
+        "content": body_content
+    }
+
 class NotificationService:
     def __init__(self):
         self.sendgrid_client = None
@@ -38,15 +160,15 @@ class NotificationService:
         try:
             from_email = os.getenv("FROM_EMAIL", "noreply@quizsystem.com")
             
-            message = Mail(
-                from_email=from_email,
-                to_emails=to_email,
-                subject=subject,
-                plain_text_content=content,
-                html_content=html_content
+            request_body = build_mail_request_body(
+                from_email,
+                [{"to": [{"email": to_email}]}],
+                subject,
+                content,
+                html_content
             )
             
-            response = self.sendgrid_client.send(message)
+            response = self.sendgrid_client.client.mail.send.post(request_body=request_body)
             logger.info(f"Email sent successfully to {to_email}, status: {response.status_code}")
             return True
             
@@ -54,6 +176,43 @@ class NotificationService:
             logger.error(f"Failed to send email to {to_email}: {str(e)}")
             return False
     
+    def send_bulk_email(self, recipients: List[Tuple[str, Dict[str, str]]], subject: str, content: str, html_content: str = None) -> int:
+        """Send one email per recipient via SendGrid personalizations; returns how many were accepted."""
+        if not self.sendgrid_client:
+            logger.warning("SendGrid not configured, skipping email notification")
+            return 0
+        
+        from_email = os.getenv("FROM_EMAIL", "noreply@quizsystem.com")
+        sent = 0
+        
+        for start in range(0, len(recipients), SENDGRID_MAX_PERSONALIZATIONS):
+            batch = recipients[start:start + SENDGRID_MAX_PERSONALIZATIONS]
+            try:
+                request_body = build_mail_request_body(
+                    from_email,
+                    [{"to": [{"email": email}], "substitutions": substitutions} for email, substitutions in batch],
+                    subject,
+                    content,
+                    html_content
+                )
+                
+                response = self.sendgrid_client.client.mail.send.post(request_body=request_body)
+                logger.info(f"Email sent successfully to {len(batch)} recipients, status: {response.status_code}")
+                sent += len(batch)
+                
+            except Exception as e:
+                logger.error(f"Failed to send email batch of {len(batch)} recipients: {str(e)}")
+        
+        return sent
+    
+    def queue_email(self, to_email: str, subject: str, content: str, html_content: str = None) -> None:
+        """Send an email in the background without blocking the caller."""
+        send_executor.submit(self.send_email, to_email, subject, content, html_content)
+    
+    def queue_bulk_email(self, recipients: List[Tuple[str, Dict[str, str]]], subject: str, content: str, html_content: str = None) -> None:
+        """Send personalized bulk email in the background without blocking the caller."""
+        send_executor.submit(self.send_bulk_email, recipients, subject, content, html_content)
+    
     def send_sms(self, to_phone: str, message: str) -> bool:
         """Send SMS notification using Twilio."""
         if not self.twilio_client:
@@ -93,10 +252,22 @@ class NotificationService:
         return notification
     
     def notify_quiz_completed(self, db: Session, quiz_result: QuizResult) -> None:
-        """Send notification when a quiz is completed."""
+        """Send notification when a quiz is completed.
+        
+        Callers that already joinedload QuizResult.quiz and QuizResult.student skip the refetch.
+        """
         try:
-            # Get student information
-            student = db.query(User).filter(User.id == quiz_result.student_id).first()
+            # Load quiz and student together instead of two lazy loads
+            state = inspect(quiz_result)
+            if state.identity and ("quiz" in state.unloaded or "student" in state.unloaded):
+                quiz_result = db.query(QuizResult).options(
+                    joinedload(QuizResult.quiz),
+                    joinedload(QuizResult.student)
+                ).filter(QuizResult.id == state.identity[0]).first()
+                if not quiz_result:
+                    return
+            
+            student = quiz_result.student
             if not student:
                 return
             
@@ -114,41 +285,19 @@ class NotificationService:
             
             # Send email notification
             email_subject = f"Quiz Completed - {quiz_result.quiz.title}"
-            email_content = f"""
-            Hello {student.full_name},
-            
-            You have successfully completed the quiz: {quiz_result.quiz.title}
+            email_fields = {
+                "full_name": student.full_name,
+                "quiz_title": quiz_result.quiz.title,
+                "total_score": quiz_result.total_score,
+                "max_score": quiz_result.max_score,
+                "percentage": f"{quiz_result.percentage:.1f}",
+                "minutes_taken": quiz_result.time_taken // 60
+            }
+            email_content = COMPLETED_EMAIL_TEXT.substitute(email_fields)
             
-            Your Results:
-            - Score: {quiz_result.total_score}/{quiz_result.max_score}
-            - Percentage: {quiz_result.percentage:.1f}%
-            - Time Taken: {quiz_result.time_taken // 60} minutes
-            
-            Thank you for taking the quiz!
-            """
-            
-            html_content = f"""
-            <html>
-            <body>
-                <h2>Quiz Completed Successfully!</h2>
-                <p>Hello {student.full_name},</p>
-                <p>You have successfully completed the quiz: <strong>{quiz_result.quiz.title}</strong></p>
-                
-                <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>Your Results:</h3>
-                    <ul>
-                        <li><strong>Score:</strong> {quiz_result.total_score}/{quiz_result.max_score}</li>
-                        <li><strong>Percentage:</strong> {quiz_result.percentage:.1f}%</li>
-                        <li><strong>Time Taken:</strong> {quiz_result.time_taken // 60} minutes</li>
-                    </ul>
-                </div>
-                
-                <p>Thank you for taking the quiz!</p>
-            </body>
-            </html>
-            """
+            html_content = COMPLETED_EMAIL_HTML.substitute(email_fields)
             
-            self.send_email(student.email, email_subject, email_content, html_content)
+            self.queue_email(student.email, email_subject, email_content, html_content)
             
             logger.info(f"Quiz completion notification sent to student {student.id}")
             
@@ -162,60 +311,43 @@ class NotificationService:
             if not quiz:
                 return
             
-            for student_id in student_ids:
-                student = db.query(User).filter(User.id == student_id).first()
-                if not student:
-                    continue
-                
-                # Create notification record
-                title = "New Quiz Assigned"
-                message = f"A new quiz '{quiz.title}' has been assigned to you"
-                
-                self.create_notification(
-                    db=db,
-                    user_id=student.id,
-                    title=title,
-                    message=message,
-                    notification_type="quiz_assigned"
-                )
-                
-                # Send email notification
-                email_subject = f"New Quiz Assigned - {quiz.title}"
-                email_content = f"""
-                Hello {student.full_name},
-                
-                A new quiz has been assigned to you:
-                
-                Quiz: {quiz.title}
-                Description: {quiz.description or 'No description available'}
-                Time Limit: {quiz.time_limit} minutes
-                Questions: {quiz.total_questions}
-                
-                Please log in to your account to take the quiz.
-                """
-                
-                html_content = f"""
-                <html>
-                <body>
-                    <h2>New Quiz Assigned!</h2>
-                    <p>Hello {student.full_name},</p>
-                    <p>A new quiz has been assigned to you:</p>
-                    
-                    <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                        <h3>{quiz.title}</h3>
-                        <p><strong>Description:</strong> {quiz.description or 'No description available'}</p>
-                        <p><strong>Time Limit:</strong> {quiz.time_limit} minutes</p>
-                        <p><strong>Questions:</strong> {quiz.total_questions}</p>
-                    </div>
-                    
-                    <p>Please log in to your account to take the quiz.</p>
-                </body>
-                </html>
-                """
-                
-                self.send_email(student.email, email_subject, email_content, html_content)
+            # Only the columns needed below; rows come back as tuples, not User instances
+            students = db.query(User.id, User.email, User.full_name).filter(User.id.in_(student_ids)).all()
+            if not students:
+                return
+            
+            # Create all notification records in one insert and commit
+            title = "New Quiz Assigned"
+            message = f"A new quiz '{quiz.title}' has been assigned to you"
+            
+            db.bulk_insert_mappings(Notification, [
+                {
+                    "user_id": student_id,
+                    "title": title,
+                    "message": message,
+                    "notification_type": "quiz_assigned"
+                }
+                for student_id, _, _ in students
+            ])
+            db.commit()
             
-            logger.info(f"Quiz assignment notifications sent to {len(student_ids)} students")
+            # Send one personalized email per student in batched SendGrid calls
+            email_subject = f"New Quiz Assigned - {quiz.title}"
+            email_fields = {
+                "full_name": FULL_NAME_TAG,
+                "quiz_title": quiz.title,
+                "description": quiz.description or 'No description available',
+                "time_limit": quiz.time_limit,
+                "total_questions": quiz.total_questions
+            }
+            email_content = ASSIGNED_EMAIL_TEXT.substitute(email_fields)
+            
+            html_content = ASSIGNED_EMAIL_HTML.substitute(email_fields)
+            
+            recipients = [(email, {FULL_NAME_TAG: str(full_name)}) for _, email, full_name in students]
+            self.queue_bulk_email(recipients, email_subject, email_content, html_content)
+            
+            logger.info(f"Quiz assignment notifications sent to {len(students)} students")
             
         except Exception as e:
             logger.error(f"Failed to send quiz assignment notifications: {str(e)}")
@@ -243,48 +375,39 @@ class NotificationService:
             
             # Send email notification
             email_subject = f"Quiz Approved - {quiz.title}"
-            email_content = f"""
-            Hello {teacher.full_name},
+            email_fields = {
+                "full_name": teacher.full_name,
+                "quiz_title": quiz.title,
+                "description": quiz.description or 'No description available',
+                "total_questions": quiz.total_questions
+            }
+            email_content = APPROVED_EMAIL_TEXT.substitute(email_fields)
             
-            Your quiz has been approved and is now available to students:
+            html_content = APPROVED_EMAIL_HTML.substitute(email_fields)
             
-            Quiz: {quiz.title}
-            Description: {quiz.description or 'No description available'}
-            Questions: {quiz.total_questions}
-            
-            Students can now access and take this quiz.
-            """
-            
-            html_content = f"""
-            <html>
-            <body>
-                <h2>Quiz Approved!</h2>
-                <p>Hello {teacher.full_name},</p>
-                <p>Your quiz has been approved and is now available to students:</p>
-                
-                <div style="background-color: #f0f9ff; padding: 20px; border-radius: 8px; margin: 20px 0;">
-                    <h3>{quiz.title}</h3>
-                    <p><strong>Description:</strong> {quiz.description or 'No description available'}</p>
-                    <p><strong>Questions:</strong> {quiz.total_questions}</p>
-                </div>
-                
-                <p>Students can now access and take this quiz.</p>
-            </body>
-            </html>
-            """
-            
-            self.send_email(teacher.email, email_subject, email_content, html_content)
+            self.queue_email(teacher.email, email_subject, email_content, html_content)
             
             logger.info(f"Quiz approval notification sent to teacher {teacher.id}")
             
         except Exception as e:
             logger.error(f"Failed to send quiz approval notification: {str(e)}")
     
-    def get_user_notifications(self, db: Session, user_id: int, limit: int = 50) -> List[Notification]:
-        """Get notifications for a user."""
-        return db.query(Notification).filter(
-            Notification.user_id == user_id
-        ).order_by(Notification.created_at.desc()).limit(limit).all()
+    def get_user_notifications(self, db: Session, user_id: int, limit: int = 50,
+                               before_created_at: Optional[datetime] = None, before_id: Optional[int] = None) -> List[Notification]:
+        """Get notifications for a user, newest first.
+        
+        Pass the last item's created_at and id as the cursor for the next page (keyset pagination).
+        """
+        query = db.query(Notification).filter(Notification.user_id == user_id)
+        if before_created_at is not None:
+            if before_id is not None:
+                query = query.filter(or_(
+                    Notification.created_at < before_created_at,
+                    and_(Notification.created_at == before_created_at, Notification.id < before_id)
+                ))
+            else:
+                query = query.filter(Notification.created_at < before_created_at)
+        return query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit).all()
     
     def mark_notification_read(self, db: Session, notification_id: int, user_id: int) -> bool:
         """Mark a notification as read."""
@@ -305,7 +428,7 @@ class NotificationService:
         updated_count = db.query(Notification).filter(
             Notification.user_id == user_id,
             Notification.is_read == False
-        ).update({"is_read": True})
+        ).update({"is_read": True}, synchronize_session=False)
         
         db.commit()
         return updated_count
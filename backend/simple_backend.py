@@ -4,8 +4,10 @@ from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 import hashlib
+import hmac
 import secrets
 from datetime import datetime
+from itertools import count
 
 app = FastAPI()
 
@@ -23,19 +25,51 @@ users_db = []
 quizzes_db = []
 quiz_results_db = []
 
+# Lookup indexes over users_db, kept in sync by _add_user/_remove_user
+users_by_email = {}
+users_by_id = {}
+# Super admin takes id 1; ids are never reused after a delete so the id index stays unambiguous
+user_ids = count(2)
+
+def _add_user(user: dict) -> None:
+    """Store a user and index it by email and id"""
+    users_db.append(user)
+    users_by_email[user['email']] = user
+    users_by_id[user['id']] = user
+
+def _remove_user(user: dict) -> None:
+    """Remove a user and its index entries"""
+    users_db.remove(user)
+    users_by_email.pop(user['email'], None)
+    users_by_id.pop(user['id'], None)
+
 # Password hashing functions
+PASSWORD_HASH_SCHEME = "pbkdf2_sha256"
+PASSWORD_HASH_ITERATIONS = int(os.getenv('PASSWORD_HASH_ITERATIONS', '200000'))
+
+def _salted_sha256(password: str, salt: str) -> str:
+    """Hex SHA-256 of password followed by salt (legacy salt:hash format)"""
+    digest = hashlib.sha256(password.encode())
+    digest.update(salt.encode())
+    return digest.hexdigest()
+
 def hash_password(password: str) -> str:
-    """Hash a password using SHA-256 with salt"""
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
-    return f"{salt}:{password_hash}"
+    """Hash a password using PBKDF2-HMAC-SHA256 with a random salt"""
+    salt = secrets.token_bytes(16)
+    derived_key = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PASSWORD_HASH_ITERATIONS)
+    return f"{PASSWORD_HASH_SCHEME}${PASSWORD_HASH_ITERATIONS}${salt.hex()}${derived_key.hex()}"
 
 def verify_password(password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     try:
+        if hashed_password.startswith(PASSWORD_HASH_SCHEME + "$"):
+            _, iterations, salt_hex, key_hex = hashed_password.split('$')
+            derived_key = hashlib.pbkdf2_hmac('sha256', password.encode(), bytes.fromhex(salt_hex), int(iterations))
+            return hmac.compare_digest(derived_key, bytes.fromhex(key_hex))
+        
         salt, password_hash = hashed_password.split(':')
-        return hashlib.sha256((password + salt).encode()).hexdigest() == password_hash
-    except:
+        return hmac.compare_digest(_salted_sha256(password, salt), password_hash)
+    except (ValueError, AttributeError):
         return False
 
 # Create super admin
@@ -43,8 +77,7 @@ def create_super_admin():
     super_admin_email = os.getenv('SUPER_ADMIN_EMAIL', 'hasanatk007@gmail.com')
     super_admin_password = os.getenv('SUPER_ADMIN_PASSWORD', 'Reshun@786')
     
-    super_admin_exists = any(user.get('email') == super_admin_email for user in users_db)
-    if not super_admin_exists:
+    if super_admin_email not in users_by_email:
         hashed_password = hash_password(super_admin_password)
         super_admin = {
             "id": 1,
@@ -54,7 +87,7 @@ def create_super_admin():
             "role": "super_admin",
             "created_at": datetime.now().isoformat()
         }
-        users_db.append(super_admin)
+        _add_user(super_admin)
         print(f"Super Admin created: {super_admin_email}")
 
 # Create super admin on startup
@@ -78,7 +111,7 @@ def login_user(credentials: dict):
         raise HTTPException(status_code=400, detail="Email and password are required")
     
     # Find user
-    user = next((u for u in users_db if u['email'] == email), None)
+    user = users_by_email.get(email)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
@@ -99,7 +132,7 @@ def register_user(user_data: dict):
             if field not in user_data:
                 raise HTTPException(status_code=400, detail=f"Field '{field}' is required")
         
-        if any(user.get('email') == user_data['email'] for user in users_db):
+        if user_data['email'] in users_by_email:
             raise HTTPException(status_code=400, detail="Email already registered")
         
         if user_data['role'] == "admin":
@@ -107,14 +140,14 @@ def register_user(user_data: dict):
         
         hashed_password = hash_password(user_data['password'])
         new_user = {
-            "id": len(users_db) + 1,
+            "id": next(user_ids),
             "name": user_data['name'],
             "email": user_data['email'],
             "password": hashed_password,
             "role": user_data['role'],
             "created_at": datetime.now().isoformat()
         }
-        users_db.append(new_user)
+        _add_user(new_user)
         
         user_response = {k: v for k, v in new_user.items() if k != 'password'}
         return {"message": "User registered successfully", "user": user_response}
@@ -128,7 +161,7 @@ def register_user(user_data: dict):
 def get_admin_dashboard(admin_id: int):
     """Get admin dashboard data"""
     try:
-        admin_user = next((user for user in users_db if user['id'] == admin_id), None)
+        admin_user = users_by_id.get(admin_id)
         if not admin_user:
             raise HTTPException(status_code=404, detail="Admin user not found")
         
@@ -159,21 +192,21 @@ def get_admin_dashboard(admin_id: int):
 def delete_user(user_id: int, admin_id: int):
     """Delete a user (admin only)"""
     try:
-        admin_user = next((user for user in users_db if user['id'] == admin_id), None)
+        admin_user = users_by_id.get(admin_id)
         if not admin_user:
             raise HTTPException(status_code=404, detail="Admin user not found")
         
         if admin_user['role'] not in ['admin', 'super_admin']:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        user_to_delete = next((user for user in users_db if user['id'] == user_id), None)
+        user_to_delete = users_by_id.get(user_id)
         if not user_to_delete:
             raise HTTPException(status_code=404, detail="User not found")
         
         if user_to_delete['role'] == 'super_admin':
             raise HTTPException(status_code=403, detail="Cannot delete super admin")
         
-        users_db.remove(user_to_delete)
+        _remove_user(user_to_delete)
         return {"message": f"User {user_to_delete['name']} deleted successfully"}
         
     except HTTPException:
@@ -185,7 +218,7 @@ def delete_user(user_id: int, admin_id: int):
 def get_all_credentials(admin_id: int):
     """Get all user credentials (super admin only)"""
     try:
-        admin_user = next((user for user in users_db if user['id'] == admin_id), None)
+        admin_user = users_by_id.get(admin_id)
         if not admin_user:
             raise HTTPException(status_code=404, detail="Admin user not found")
         
@@ -186,5 +186,90 @@ def test_school_system():
     print("✅ School analytics and reporting")
     print("✅ Multi-tenant architecture")
 
+def test_search_schools_matches_inside_words():
+    """Search must still find schools where the query starts partway into a word"""
+    from school_system import SchoolSystem, SchoolRegistration, SchoolAdminRegistration
+    
+    system = SchoolSystem()
+    for index, name in enumerate(["High School", "Ighton Academy"]):
+        school_data = SchoolRegistration(
+            school_name=name,
+            school_type="high",
+            address="1 Search Street",
+            city="Springfield",
+            state="IL",
+            country="USA",
+            postal_code="62701",
+            phone="+1-555-0100",
+            email=f"info{index}@search.edu",
+            principal_name="Dr. Search",
+            established_year=1990
+        )
+        admin_data = SchoolAdminRegistration(
+            name="Search Admin",
+            email=f"admin{index}@search.edu",
+            password="adminpass123",
+            phone="+1-555-0101",
+            school_id=""
+        )
+        system.create_school(school_data, admin_data)
+    
+    names = sorted(school["name"] for school in system.search_schools("igh"))
+    assert names == ["High School", "Ighton Academy"], names
+    names = sorted(school["name"] for school in system.search_schools("gh school"))
+    assert names == ["High School"], names
+    names = sorted(school["name"] for school in system.search_schools("hton"))
+    assert names == ["Ighton Academy"], names
+    assert system.search_schools("zzz") == []
+    print("✅ School search matches inside words")
+
+def test_duplicate_email_registration_is_rejected():
+    """Registering a new user with an existing email must fail and leave the original login working"""
+    from fastapi.testclient import TestClient
+    from school_backend import app
+    
+    client = TestClient(app)
+    school_data = {
+        "school_name": "Duplicate Email High",
+        "school_type": "high",
+        "address": "1 Unique Street",
+        "city": "Springfield",
+        "state": "IL",
+        "country": "USA",
+        "postal_code": "62701",
+        "phone": "+1-555-0110",
+        "email": "info@duplicate.edu",
+        "principal_name": "Dr. Unique",
+        "established_year": 1990
+    }
+    admin_data = {
+        "name": "Unique Admin",
+        "email": "admin@duplicate.edu",
+        "password": "Adminpass123!",
+        "phone": "+1-555-0111",
+        "school_id": ""
+    }
+    response = client.post("/api/schools/register", json={"school_data": school_data, "admin_data": admin_data})
+    assert response.status_code == 200, response.text
+    school_id = response.json()["school"]["id"]
+    
+    student_data = {
+        "name": "Impostor",
+        "email": "admin@duplicate.edu",
+        "password": "Studentpass123!",
+        "school_id": school_id,
+        "grade_level": "9th",
+        "student_id": "DUP1",
+        "date_of_birth": "2010-01-01"
+    }
+    response = client.post(f"/api/schools/{school_id}/students/register", json=student_data)
+    assert response.status_code == 400, response.text
+    
+    response = client.post("/api/auth/login", json={"email": "admin@duplicate.edu", "password": "Adminpass123!"})
+    assert response.status_code == 200, response.text
+    print("✅ Duplicate email registration rejected")
+
 if __name__ == "__main__":
+    test_search_schools_matches_inside_words()
+    test_duplicate_email_registration_is_rejected()
     test_school_system()